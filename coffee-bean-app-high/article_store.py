@@ -0,0 +1,180 @@
+import os
+import threading
+from urllib.parse import urlencode
+
+from assets import ASSETS_HOT_RELOAD
+
+try:
+    import markdown
+except ImportError:
+    markdown = None  # Bodies are then passed to st.markdown as they are
+
+# Edu blog articles, discovered from content/blog/*.md.
+# Each file starts with a front-matter block:
+#
+#     ---
+#     title: Understanding Arabica Coffee Beans
+#     excerpt: If you're a coffee lover...
+#     tags: arabica, beans
+#     order: 0
+#     ---
+#
+# Only the front matter is read when the folder is scanned; an article's body
+# is read and rendered to HTML (with the optional `markdown` package) the
+# first time it is opened, then kept in memory. Articles are numbered by
+# (order, file name) so existing ?blog=<index> links keep pointing at the same
+# article. In development the folder and files are rescanned when they change.
+
+base_dir = os.path.abspath(os.path.dirname(__file__))
+
+ARTICLES_DIR = os.getenv("ARTICLES_DIR", os.path.join(base_dir, "content", "blog"))
+ARTICLES_PER_PAGE = int(os.getenv("ARTICLES_PER_PAGE", "10"))
+
+_FRONT_MATTER = "---"
+
+
+# Function to read the front matter of an article file without reading its body
+def read_front_matter(path):
+    fields = {}
+    with open(path, "r", encoding="utf-8") as f:
+        if f.readline().strip() != _FRONT_MATTER:
+            return fields
+        for line in f:
+            line = line.strip()
+            if line == _FRONT_MATTER:
+                break
+            key, sep, value = line.partition(":")
+            if sep:
+                fields[key.strip().lower()] = value.strip()
+    return fields
+
+
+def read_body(path):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.startswith(_FRONT_MATTER):
+        end = text.find(f"\n{_FRONT_MATTER}", len(_FRONT_MATTER))
+        if end != -1:
+            text = text[end + len(_FRONT_MATTER) + 1:].lstrip("\n")
+    return text
+
+
+class Article:
+    __slots__ = ("index", "slug", "path", "title", "excerpt", "tags", "order", "mtime", "card_html", "_html", "_html_mtime")
+
+    def __init__(self, index, path, fields, mtime):
+        self.index = index
+        self.slug = os.path.splitext(os.path.basename(path))[0]
+        self.path = path
+        self.title = fields.get("title") or self.slug
+        self.excerpt = fields.get("excerpt", "")
+        self.tags = tuple(tag.strip() for tag in fields.get("tags", "").split(",") if tag.strip())
+        self.order = fields.get("order")
+        self.mtime = mtime
+        self._html = None
+        self._html_mtime = None
+        self.card_html = f"""
+                <div class="card">
+                    <h3>{self.title}</h3>
+                    <p>{self.excerpt}</p>
+                    <a href="?{urlencode({'blog': index, 'authenticated': 'true', 'page': 'edu_blog'})}", target="_blank">
+                        <button class="read-more-button">Read More</button>
+                    </a>
+                </div>
+                """
+
+    # Rendered body, read from disk on first use
+    @property
+    def html(self):
+        if self._html is None or (ASSETS_HOT_RELOAD and os.path.getmtime(self.path) != self._html_mtime):
+            mtime = os.path.getmtime(self.path)
+            body = read_body(self.path)
+            if markdown is not None:
+                body = markdown.markdown(body)
+            self._html, self._html_mtime = body, mtime
+        return self._html
+
+
+class ArticleStore:
+    def __init__(self, directory=ARTICLES_DIR):
+        self.directory = directory
+        self.articles = ()
+        self.by_slug = {}
+        self.by_tag = {}
+        self._signature = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _scan_signature(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".md") and entry.is_file()]
+        return tuple(sorted((entry.path, entry.stat().st_mtime) for entry in entries))
+
+    # Function to (re)build the index when files were added, removed or edited
+    def refresh(self):
+        signature = self._scan_signature()
+        with self._lock:
+            if signature == self._signature:
+                return
+            found = []
+            for path, mtime in signature:
+                try:
+                    fields = read_front_matter(path)
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"Error reading article {path}: {e}")
+                    continue
+                try:
+                    order = int(fields.get("order", ""))
+                except ValueError:
+                    order = float("inf")  # Unordered articles go last, by file name
+                found.append((order, os.path.basename(path), path, fields, mtime))
+            found.sort(key=lambda item: item[:2])
+
+            articles = tuple(Article(index, path, fields, mtime) for index, (_, _, path, fields, mtime) in enumerate(found))
+            by_tag = {}
+            for article in articles:
+                for tag in article.tags:
+                    by_tag.setdefault(tag.lower(), []).append(article)
+            self.articles = articles
+            self.by_slug = {article.slug: article for article in articles}
+            self.by_tag = {tag: tuple(items) for tag, items in by_tag.items()}
+            self._signature = signature
+
+    def __len__(self):
+        return len(self.articles)
+
+    def get(self, index):
+        if 0 <= index < len(self.articles):
+            return self.articles[index]
+        return None
+
+    def tagged(self, tag):
+        return self.by_tag.get(tag.lower(), ())
+
+    # Page through the articles (pages are 1-based)
+    def page(self, page, page_size=ARTICLES_PER_PAGE):
+        page, page_size = max(1, page), max(1, page_size)
+        start = (page - 1) * page_size
+        total = len(self.articles)
+        return {
+            "entries": self.articles[start:start + page_size],
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "pages": (total + page_size - 1) // page_size,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# Function to get the process-wide article store
+def get_article_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArticleStore()
+    elif ASSETS_HOT_RELOAD:
+        _store.refresh()
+    return _store
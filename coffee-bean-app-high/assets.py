@@ -0,0 +1,160 @@
+import base64
+import json
+import os
+import re
+import sys
+import threading
+import uuid
+from io import BytesIO
+
+import streamlit as st
+
+# Static asset cache for the app's CSS, HTML, JS, JSON and text files.
+# Each file is read, minified and interned once per process and then served
+# from memory. In development (ENVIRONMENT=development) the file's mtime is
+# checked on every lookup so edits show up on the next rerun. The stylesheet
+# is injected at most once per script run, however many pages ask for it.
+# Inline icons are downscaled to twice their display size (for high-DPI
+# screens), recompressed and kept as PNG bytes and data URIs.
+
+base_dir = os.path.abspath(os.path.dirname(__file__))
+
+ASSETS_HOT_RELOAD = os.getenv("ENVIRONMENT") == "development"
+
+# Icon file -> largest side in pixels after optimizing (2x the displayed size)
+ICON_SIZES = {
+    "wa-icon.png": 40,  # Shown at 20 px on the game share button
+    "pdf-icon-fix.png": 140,  # Shown at 70 px next to the report download
+}
+
+_RUN_ID_KEY = "_assets_run_id"
+_INJECTED_KEY = "_assets_injected_css"
+
+_assets = {}  # (name, kind) -> (mtime, value)
+_lock = threading.Lock()
+
+
+# Functions to shrink CSS and HTML without changing how they render
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_html(html):
+    # Also keeps st.markdown from treating indented HTML as a code block
+    html = re.sub(r"<!--.*?-->", "", html, flags=re.DOTALL)
+    return "\n".join(line.strip() for line in html.splitlines() if line.strip())
+
+
+def _optimize_image(path, max_size):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _read(path, kind):
+    if isinstance(kind, tuple):  # ("image", max_size)
+        return _optimize_image(path, kind[1])
+    if kind == "bytes":
+        with open(path, "rb") as f:
+            return f.read()
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if kind == "json":
+        return json.loads(text)
+    if kind == "css":
+        text = minify_css(text)
+    elif kind == "html":
+        text = minify_html(text)
+    return sys.intern(text)
+
+
+def _get(name, kind):
+    path = os.path.join(base_dir, name)
+    key = (name, kind)
+    cached = _assets.get(key)
+    if cached is not None and not ASSETS_HOT_RELOAD:
+        return cached[1]
+
+    mtime = os.path.getmtime(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _lock:
+        cached = _assets.get(key)
+        if cached is None or cached[0] != mtime:
+            cached = _assets[key] = (mtime, _read(path, kind))
+    return cached[1]
+
+
+def get_text(name):
+    return _get(name, "text")
+
+
+def get_css(name="style.css"):
+    return _get(name, "css")
+
+
+def get_html(name):
+    return _get(name, "html")
+
+
+# Parsed JSON is shared between sessions: treat it as read-only
+def get_json(name):
+    return _get(name, "json")
+
+
+def get_bytes(name):
+    return _get(name, "bytes")
+
+
+# Function to get an icon as optimized PNG bytes
+def get_icon_bytes(name, max_size=None):
+    return _get(name, ("image", max_size or ICON_SIZES.get(name, 64)))
+
+
+# Function to get an icon as a data URI for inline <img> tags
+def get_icon_data_uri(name, max_size=None):
+    key = (name, ("data_uri", max_size))
+    png = get_icon_bytes(name, max_size)
+    cached = _assets.get(key)
+    if cached is None or cached[0] is not png:
+        cached = _assets[key] = (png, "data:image/png;base64," + base64.b64encode(png).decode())
+    return cached[1]
+
+
+# Function to optimize every known icon up front (cheap once they are cached)
+def preload_icons():
+    for name in ICON_SIZES:
+        try:
+            get_icon_data_uri(name)
+        except OSError as e:
+            print(f"Error preparing icon {name}: {e}")
+
+
+# Function to mark the start of a script run (called once at the top of main)
+def begin_run():
+    st.session_state[_RUN_ID_KEY] = uuid.uuid4().hex
+
+
+# Function to add a stylesheet to the page, once per script run
+def inject_css(name="style.css"):
+    run_id = st.session_state.get(_RUN_ID_KEY)
+    if run_id is not None:
+        injected = st.session_state.get(_INJECTED_KEY)
+        if injected is None or injected[0] != run_id:
+            injected = st.session_state[_INJECTED_KEY] = (run_id, set())
+        if name in injected[1]:
+            return
+        injected[1].add(name)
+    # Without a run id (a page run on its own) always inject
+    st.markdown(f"<style>{get_css(name)}</style>", unsafe_allow_html=True)
@@ -0,0 +1,32 @@
+import os
+
+import numpy as np
+
+from model_registry import get_model
+from tray_analysis import boxes_to_array
+
+# Bean detection shared by the Predict page and the bulk_classify CLI.
+# Nothing here imports Streamlit, so command-line tools can load the model and
+# score results without running the page module.
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+model_path = os.path.join(base_dir, 'best-nano.pt')
+
+# Confidence threshold for considering the detected object as a coffee bean
+CONFIDENCE_THRESHOLD = 0.5
+
+
+# Function to get the process-wide YOLOv8 bean model
+def get_bean_model():
+    return get_model(model_path)
+
+
+# Function to pick the highest-confidence box from the detection results
+def find_best_detection(results):
+    data = boxes_to_array(results[0])
+    if not len(data):  # Check if any objects were detected
+        return None, 0
+
+    best_index = int(np.argmax(data[:, 4]))  # Confidence score is column 4
+    best_result = data[best_index].tolist()
+    return best_result, best_result[4]
@@ -0,0 +1,232 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import cv2
+
+from preprocessing import encode_report_image, load_image, load_report_input_image
+
+# Bulk classification of a folder or ZIP archive of bean photos, for nightly
+# lot runs outside the web app:
+#
+#   python bulk_classify.py lot-42.zip --output lot-42.csv
+#   python bulk_classify.py /data/lot-42 --output lot-42.parquet --workers 8
+#   python bulk_classify.py lot-42.zip --certificate lot-42-certificate.pdf
+#
+# Images are decoded and letterboxed in a process pool, sent to YOLO in
+# batches and written out incrementally, so memory stays bounded no matter how
+# many images the lot contains. The certificate embeds at most
+# --certificate-pages sample pages (CERTIFICATE_MAX_SAMPLE_PAGES by default) and
+# counts the remaining samples in its summary page.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+RESULT_FIELDS = ["image", "is_coffee_bean", "predicted_class", "confidence", "x1", "y1", "x2", "y2", "error"]
+
+
+# Function to list image names in a directory or ZIP archive, lazily
+def iter_image_names(source):
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield info.filename
+    else:
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.relpath(os.path.join(root, file_name), source)
+
+
+# Each worker process keeps its own handle on the archive
+_worker_archive = None
+
+
+def _init_worker(source):
+    global _worker_archive
+    if zipfile.is_zipfile(source):
+        _worker_archive = zipfile.ZipFile(source)
+
+
+# Function run in the process pool: read, decode and preprocess one image
+# (plus a report-sized JPEG of the original when a certificate is requested)
+def _preprocess_image(source, name, with_thumbnail=False):
+    try:
+        if _worker_archive is not None:
+            data = _worker_archive.read(name)
+        else:
+            with open(os.path.join(source, name), "rb") as f:
+                data = f.read()
+        thumbnail = encode_report_image(load_report_input_image(BytesIO(data))) if with_thumbnail else None
+        return name, load_image(BytesIO(data)), None, thumbnail
+    except Exception as e:
+        return name, None, str(e), None
+
+
+# Function to preprocess images in parallel with a bounded number in flight
+def iter_preprocessed(source, workers, max_in_flight, with_thumbnails=False):
+    context = multiprocessing.get_context("spawn")  # Workers must not inherit the loaded model
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(source,)) as pool:
+        pending = deque()
+        for name in iter_image_names(source):
+            pending.append(pool.submit(_preprocess_image, source, name, with_thumbnails))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class CsvResultWriter:
+    def __init__(self, path):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS)
+        self._writer.writeheader()
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    def __init__(self, path):
+        import pyarrow as pa  # Installed alongside Streamlit
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ("image", pa.string()),
+            ("is_coffee_bean", pa.bool_()),
+            ("predicted_class", pa.string()),
+            ("confidence", pa.float64()),
+            ("x1", pa.float64()),
+            ("y1", pa.float64()),
+            ("x2", pa.float64()),
+            ("y2", pa.float64()),
+            ("error", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write_rows(self, rows):
+        # One row group per batch keeps only a single batch in memory
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_result_writer(path):
+    if path.lower().endswith(".parquet"):
+        return ParquetResultWriter(path)
+    return CsvResultWriter(path)
+
+
+# Function to classify one batch of preprocessed images with the shared model,
+# adding each image to the certificate when one is being built
+def classify_batch(model, batch, certificate=None):
+    from bean_detection import CONFIDENCE_THRESHOLD, find_best_detection
+
+    rows = []
+    images = [image for _, image, _, _ in batch if image is not None]
+    results = iter(model.predict(source=images, save=False, verbose=False) if images else [])
+
+    for name, image, error, thumbnail in batch:
+        row = dict.fromkeys(RESULT_FIELDS)
+        row.update({"image": name, "is_coffee_bean": False, "error": error})
+        if image is not None:
+            best_result, max_confidence = find_best_detection([next(results)])
+            row["confidence"] = float(max_confidence)
+            if best_result and max_confidence >= CONFIDENCE_THRESHOLD:
+                row["is_coffee_bean"] = True
+                row["predicted_class"] = model.names[int(best_result[5])]
+                row["x1"], row["y1"], row["x2"], row["y2"] = (float(v) for v in best_result[:4])
+
+                # Draw bounding box and label on the image
+                x1, y1, x2, y2 = map(int, best_result[:4])
+                cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                label = f"{row['predicted_class']} {max_confidence:.2f}"
+                cv2.putText(image, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (36, 255, 12), 2)
+
+            if certificate is not None:
+                certificate.add_sample(thumbnail, image, row["predicted_class"], row["confidence"], name)
+        rows.append(row)
+    return rows
+
+
+def run(source, output, workers, batch_size, certificate_path=None, certificate_pages=None):
+    # Imported here so pool workers (which re-import this module) stay light
+    from bean_detection import get_bean_model
+    from report_pdf import BatchCertificate
+
+    model = get_bean_model()
+    writer = open_result_writer(output)
+    certificate = None
+    if certificate_path:
+        lot_name = os.path.basename(os.path.normpath(source))
+        certificate = BatchCertificate(lot_name) if certificate_pages is None else BatchCertificate(lot_name, certificate_pages)
+    class_totals = Counter()
+    processed = 0
+    started = time.perf_counter()
+
+    def flush(batch):
+        nonlocal processed
+        rows = classify_batch(model, batch, certificate)
+        writer.write_rows(rows)
+        class_totals.update(row["predicted_class"] or "not a coffee bean" for row in rows)
+        processed += len(rows)
+
+    try:
+        batch = []
+        # One batch being filled plus a couple of results per worker: enough to keep
+        # the pool busy, without letting memory grow with workers * batch size
+        max_in_flight = batch_size + 2 * workers
+        for item in iter_preprocessed(source, workers, max_in_flight, with_thumbnails=certificate is not None):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+                print(f"Classified {processed} images ({processed / (time.perf_counter() - started):.1f} img/s)", file=sys.stderr)
+        if batch:
+            flush(batch)
+    finally:
+        writer.close()
+
+    if certificate is not None:
+        certificate.finish(certificate_path)
+        print(f"Wrote certificate for {certificate.samples} samples ({certificate.sample_pages} sample pages) -> {certificate_path}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    print(f"Classified {processed} images in {elapsed:.1f}s -> {output}", file=sys.stderr)
+    for class_name, count in class_totals.most_common():
+        print(f"  {class_name}: {count}", file=sys.stderr)
+    return class_totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify every coffee bean image in a folder or ZIP archive.")
+    parser.add_argument("source", help="Directory or .zip archive of images")
+    parser.add_argument("--output", "-o", default="predictions.csv", help="Result file (.csv or .parquet)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Preprocessing processes")
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per YOLO forward pass")
+    parser.add_argument("--certificate", help="Also write a multi-page PDF certificate for the lot")
+    parser.add_argument("--certificate-pages", type=int, help="Most sample pages in the certificate (the rest only count in its summary)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} does not exist")
+
+    run(args.source, args.output, max(1, args.workers), max(1, args.batch_size), args.certificate, args.certificate_pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,23 @@
 import streamlit as st
-from urllib.parse import urlencode
 
 from streamlit_js_eval import streamlit_js_eval
 
 from streamlit_star_rating import st_star_rating
 
-from firebase_config import db, auth  # Import your Firebase configuration
-from firebase_admin import credentials, auth, firestore
+from firebase_admin import credentials, firestore
+from write_queue import get_write_queue
+from assets import inject_css
+from article_store import get_article_store
 
 import os
 
 # Define base directory where HTML files are located
 base_dir = os.path.abspath(os.path.dirname(__file__))
 
-# Load custom CSS
-def load_css(file_path):
-    with open(file_path) as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-        
-        
-# Function to read content from a text file
-def load_blog_content(filename):
-    # Replace 'your_directory' with the actual directory where your files are stored
-    file_path = os.path.join(base_dir, filename)
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return file.read()
 
-
-    
 def show_edu_blog_page():
     
-    css_path = os.path.join(os.path.dirname(__file__), 'style.css')
-    load_css(css_path)  # Load CSS
+    inject_css()  # Load CSS (once per run)
     
     # Initialize session state for blog viewing
     if 'viewing_blog' not in st.session_state:
@@ -44,53 +30,41 @@ def show_edu_blog_page():
     if selected_blog_index is not None:
         st.session_state.viewing_blog = int(selected_blog_index)
 
-    # Define blog posts
-    blogs = [
-        {
-            "title": "Understanding Arabica Coffee Beans",
-            "excerpt": "If you’re a coffee lover, chances are you’ve encountered Arabica coffee beans...",
-            "content": load_blog_content("arabica_blog.txt")
-        },
-        {
-            "title": "Exploring the Richness of Robusta Coffee Beans",
-            "excerpt": "If you’re seeking a bold coffee experience, Robusta coffee beans are your go-to choice!..",
-            "content": load_blog_content("robusta_blog.txt")
-        },
-        {
-            "title": "The Unique Flavor of Liberica Coffee Beans",
-            "excerpt": "Prepare your taste buds for an adventure! Liberica coffee beans are the wild card of the coffee world...",
-            "content": load_blog_content("liberica_blog.txt")
-        }
-    ]
-
+    # Blog posts (front matter scanned once per process, bodies read on first view)
+    store = get_article_store()
 
     if selected_blog_index is None:
         st.title("Edu Blog Page")
         st.write("Welcome to the Edu Blog! Here you'll find interesting articles about coffee beans.")
         
-        # CARDS 
-        for i, blog in enumerate(blogs):
-            st.markdown(
-                f"""
-                <div class="card">
-                    <h3>{blog['title']}</h3>
-                    <p>{blog['excerpt']}</p>
-                    <a href="?{urlencode({'blog': i, 'authenticated': 'true', 'page': 'edu_blog'})}", target="_blank">
-                        <button class="read-more-button">Read More</button>
-                    </a>
-                </div>
-                """, unsafe_allow_html=True
-            )
+        # CARDS (pre-rendered per article)
+        listing = store.page(st.session_state.get("blog_page", 1))
+        for blog in listing["entries"]:
+            st.markdown(blog.card_html, unsafe_allow_html=True)
+
+        # PAGINATION
+        if listing["pages"] > 1:
+            col_prev, col_info, col_next = st.columns([1, 2, 1])
+            with col_prev:
+                if st.button("Previous", disabled=listing["page"] <= 1):
+                    st.session_state.blog_page = listing["page"] - 1
+                    st.rerun()
+            with col_info:
+                st.write(f"Page {listing['page']} of {listing['pages']}")
+            with col_next:
+                if st.button("Next", disabled=listing["page"] >= listing["pages"]):
+                    st.session_state.blog_page = listing["page"] + 1
+                    st.rerun()
     else:
         selected_blog_index = int(selected_blog_index)
-        if selected_blog_index < len(blogs):
-            blog = blogs[selected_blog_index]
+        blog = store.get(selected_blog_index)
+        if blog is not None:
             # UPON CLICKING ON READ MORE 
             st.markdown(
-                f"<h1 style='color: #000000; font-family: Poppins, Arial; font-size: 40px;'>{blog['title']}</h1>", 
+                f"<h1 style='color: #000000; font-family: Poppins, Arial; font-size: 40px;'>{blog.title}</h1>", 
                 unsafe_allow_html=True
             )
-            st.markdown(blog["content"], unsafe_allow_html=True)
+            st.markdown(blog.html, unsafe_allow_html=True)
             
             
             # Custom CSS for rounded corners
@@ -112,7 +86,6 @@ def show_edu_blog_page():
                 #if 'user' in st.session_state and 'uid' in st.session_state['user']:
                     #user_uid = st.session_state['user']['uid']
                     # Save feedback to Firestore
-                    feedback_ref = db.collection("feedbacks").document()
                     feedback_data = {
                         #"user_uid": user_uid,
                         "blog_index": selected_blog_index,
@@ -120,7 +93,8 @@ def show_edu_blog_page():
                         "comment": comment,
                         "createdAt": firestore.SERVER_TIMESTAMP
                     }
-                    feedback_ref.set(feedback_data)
+                    # Queued and committed in the background
+                    get_write_queue().enqueue_set("feedbacks", feedback_data)
                     st.success(f"Thank you for your rating of {stars} stars and your comment!")
     
             if st.button("Back to Home"):
@@ -1,11 +1,17 @@
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
 from firebase_admin.auth import InvalidIdTokenError
+import itertools
 import os
 import json
+import threading
+
+import grpc
 
 import streamlit as st
 
+from profile_cache import invalidate_user_profile
+
 
 # Function to construct Firebase credentials from environment variables
 def get_firebase_credentials_from_env():
@@ -29,34 +35,149 @@ def get_firebase_credentials_from_env():
         "universe_domain": os.getenv("FIREBASE_UNIVERSE_DOMAIN"),
     }
 
-# Global Firestore client
+# Backend for db and auth: "firebase" (live project) or "memory" (local stand-in for load testing)
+FIREBASE_BACKEND = os.getenv("FIREBASE_BACKEND", "firebase")
+FIREBASE_FAKE_LATENCY_MS = float(os.getenv("FIREBASE_FAKE_LATENCY_MS", "0"))
+FIREBASE_FAKE_JITTER_MS = float(os.getenv("FIREBASE_FAKE_JITTER_MS", "0"))
+
+# Firestore client pool: each client owns one gRPC channel, handed out round-robin
+FIRESTORE_CHANNELS = max(1, int(os.getenv("FIRESTORE_CHANNELS", "2")))
+FIRESTORE_KEEPALIVE_SECONDS = int(os.getenv("FIRESTORE_KEEPALIVE_SECONDS", "30"))
+FIREBASE_PREWARM_TIMEOUT_SECONDS = float(os.getenv("FIREBASE_PREWARM_TIMEOUT_SECONDS", "10"))
+
+# Global Firestore client (the first one in the pool)
 db = None
 firebase_initialized = False  # Flag to track if Firebase is already initialized
+firebase_ready = threading.Event()  # Set once the pooled channels are connected
+
+_clients = []
+_channels = []
+_default_channel_clients = 0  # Pooled clients that fell back to the library's own channel
+_next_client = itertools.count()
+_init_lock = threading.Lock()
+_prewarm_thread = None
+
+# Function to swap db and auth for the in-memory backend (no credentials or network needed)
+def initialize_local_backend():
+    global db, auth
+    from local_backend import FakeLatency, LocalAuth, LocalFirestore
+
+    latency = FakeLatency(FIREBASE_FAKE_LATENCY_MS, FIREBASE_FAKE_JITTER_MS)
+    db = LocalFirestore(latency)
+    auth = LocalAuth(latency)
+    _clients.append(db)
+    print(f"Using in-memory Firebase backend ({FIREBASE_FAKE_LATENCY_MS:g} ms simulated latency).")
+
+# Function to build a Firestore client on its own gRPC channel with keepalive enabled.
+# The Firestore client has no public hook for channel options, so this sets its
+# private _target/_credentials/_firestore_api_internal attributes; they are
+# present throughout google-cloud-firestore 2.x, which requirements.txt pins.
+def create_pooled_client(app):
+    global _default_channel_clients
+    from google.cloud import firestore as cloud_firestore
+    from google.cloud.firestore_v1.services.firestore import client as firestore_client
+    from google.cloud.firestore_v1.services.firestore.transports import grpc as firestore_grpc_transport
+
+    client = cloud_firestore.Client(project=app.project_id, credentials=app.credential.get_credential())
+    try:
+        keepalive_ms = FIRESTORE_KEEPALIVE_SECONDS * 1000
+        channel = firestore_grpc_transport.FirestoreGrpcTransport.create_channel(
+            client._target,
+            credentials=client._credentials,
+            options=[
+                ("grpc.max_send_message_length", -1),
+                ("grpc.max_receive_message_length", -1),
+                ("grpc.keepalive_time_ms", keepalive_ms),
+                ("grpc.keepalive_timeout_ms", min(keepalive_ms, 20000)),
+                ("grpc.keepalive_permit_without_calls", 1),
+                ("grpc.http2.max_pings_without_data", 0),
+            ],
+        )
+        transport = firestore_grpc_transport.FirestoreGrpcTransport(host=client._target, channel=channel)
+        # The client builds its API stub lazily; hand it one on our channel instead
+        client._firestore_api_internal = firestore_client.FirestoreClient(transport=transport)
+        _channels.append(channel)
+    except Exception as e:
+        _default_channel_clients += 1  # Reported by get_firebase_health()
+        print(f"Error configuring Firestore channel, using the default one: {e}")
+    return client
 
 def initialize_firebase():
     global db, firebase_initialized
-    
-    if not firebase_initialized:
-        try:
-            # Try to get the default app, if it exists
-            firebase_admin.get_app()
-        except ValueError:
-            # If the default app doesn't exist, initialize it using credentials from environment variables
-            firebase_credentials = get_firebase_credentials_from_env()
-            cred = credentials.Certificate(firebase_credentials)
+
+    if firebase_initialized:
+        return
+    with _init_lock:
+        if firebase_initialized:
+            return
+        if FIREBASE_BACKEND == "memory":
+            initialize_local_backend()
+            firebase_ready.set()
+        else:
+            try:
+                # Try to get the default app, if it exists
+                app = firebase_admin.get_app()
+            except ValueError:
+                # If the default app doesn't exist, initialize it using credentials from environment variables
+                firebase_credentials = get_firebase_credentials_from_env()
+                cred = credentials.Certificate(firebase_credentials)
+                
+                app = firebase_admin.initialize_app(cred)
             
-            firebase_admin.initialize_app(cred)
-        
-        # Initialize Firestore
-        db = firestore.client()
+            # Initialize the Firestore client pool
+            for _ in range(FIRESTORE_CHANNELS):
+                _clients.append(create_pooled_client(app))
+            db = _clients[0]
+            print(f"Firebase initialized successfully ({len(_clients)} Firestore channels).")
         firebase_initialized = True  # Mark Firebase as initialized
-        print("Firebase initialized successfully.")
-    else:
-        print("Firebase app already initialized.s")
+
+# Function to get a Firestore client, initializing Firebase on first use
+def get_db():
+    initialize_firebase()
+    return _clients[next(_next_client) % len(_clients)]
+
+# Function to get the auth API (firebase_admin.auth, or the local stand-in)
+def get_auth():
+    initialize_firebase()
+    return auth
+
+# Function to connect the pooled channels off the request path
+def prewarm_firebase():
+    try:
+        initialize_firebase()
+        for channel in list(_channels):
+            grpc.channel_ready_future(channel).result(timeout=FIREBASE_PREWARM_TIMEOUT_SECONDS)
+        firebase_ready.set()
+        print("Firebase clients pre-warmed.")
+    except Exception as e:
+        print(f"Error pre-warming Firebase: {e}")
+
+# Function to start pre-warming once per process in a background thread
+def start_firebase_prewarm():
+    global _prewarm_thread
+    with _init_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(target=prewarm_firebase, name="firebase-prewarm", daemon=True)
+            _prewarm_thread.start()
+
+# Function for readiness checks: True once Firebase is initialized and its channels are connected
+def is_firebase_ready():
+    return firebase_ready.is_set()
+
+# Function to report this node's Firebase state (used by main's ?health=firebase probe)
+def get_firebase_health():
+    return {
+        "backend": FIREBASE_BACKEND,
+        "initialized": firebase_initialized,
+        "ready": firebase_ready.is_set(),
+        "clients": len(_clients),
+        "keepalive_channels": len(_channels),
+        "default_channel_clients": _default_channel_clients,
+    }
 
 def verify_id_token(id_token):
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = get_auth().verify_id_token(id_token)
         return decoded_token
     except InvalidIdTokenError as e:
         print(f"Error verifying ID token: {e}")
@@ -64,10 +185,8 @@ def verify_id_token(id_token):
 
 def create_user_with_email_password(email, password):
     try:
-        global db
-        
-        if db is None:
-            initialize_firebase()  # Initialize Firebase if not already initialized
+        db = get_db()  # Initializes Firebase on first use
+        auth = get_auth()
         
         user = auth.create_user(email=email, password=password)
         # Store user details in Firestore (including createdAt timestamp if not set)
@@ -81,6 +200,7 @@ def create_user_with_email_password(email, password):
             user_data["createdAt"] = firestore.SERVER_TIMESTAMP
         
         user_ref.set(user_data, merge=True)  # Merge with existing data if any
+        invalidate_user_profile(user.uid)
         
          # STORE USER UID IN SESSION STATE
         st.session_state['user'] = user.uid
@@ -93,12 +213,7 @@ def create_user_with_email_password(email, password):
 
 def verify_user_with_email_password(email, password):
     try:
-        global db
-        
-        if db is None:
-            initialize_firebase()  # Initialize Firebase if not already initialized
-        
-        user = auth.get_user_by_email(email)
+        user = get_auth().get_user_by_email(email)
         if user:
             # Implement password verification logic here
             st.session_state['user'] = user.uid  # Store user ID in session state
@@ -111,7 +226,8 @@ def verify_user_with_email_password(email, password):
 
 def update_user_password(uid, new_password):
     try:
-        auth.update_user(uid, password=new_password)
+        get_auth().update_user(uid, password=new_password)
+        invalidate_user_profile(uid)
         return True
     except Exception as e:
         print(f"Error updating password: {e}")
@@ -120,16 +236,13 @@ def update_user_password(uid, new_password):
 def delete_user_account(uid):
     try:
         # Delete the user from Firebase Authentication
-        auth.delete_user(uid)
+        get_auth().delete_user(uid)
         # Delete the user's data from Firestore
-        user_ref = db.collection("users").document(uid)
+        user_ref = get_db().collection("users").document(uid)
         user_ref.delete()
+        invalidate_user_profile(uid)
         return True
     except Exception as e:
         print(f"Error deleting user account: {e}")
         return False
 
-
-
-# Call initialize_firebase() once at the start of your application
-initialize_firebase()
\ No newline at end of file
@@ -1,35 +1,24 @@
 import streamlit as st
-import random
 import json
-import os
 
-# Define base directory where the JSON file is located
-base_dir = os.path.abspath(os.path.dirname(__file__))
-json_path = os.path.join(base_dir, 'coffee_drinks.json')
-css_path = os.path.join(base_dir, 'style.css')
-js_path = os.path.join(base_dir, 'wheel-script.js')
+from assets import get_css, get_json, get_text
 
-# Function to read file contents
-def read_file(file_path):
-    with open(file_path, 'r') as file:
-        return file.read()
-
-# Function to read JSON data
-def read_json(file_path):
-    with open(file_path, 'r') as file:
-        return json.load(file)
+# Asset files (read once and kept in memory by the asset cache)
+json_path = 'coffee_drinks.json'
+css_path = 'style.css'
+js_path = 'wheel-script.js'
 
 # Function to create the spinning wheel HTML
 def spin_the_wheel():
     # Read JSON data
-    coffee_drinks = read_json(json_path)
+    coffee_drinks = get_json(json_path)
     drinks = json.dumps([drink['name'] for drink in coffee_drinks])
     descriptions = json.dumps([drink['description'] for drink in coffee_drinks])
     images = json.dumps([drink['image'] for drink in coffee_drinks])
 
     # Read CSS and JS files
-    css_content = read_file(css_path)
-    js_content = read_file(js_path)
+    css_content = get_css(css_path)
+    js_content = get_text(js_path)
 
     return f"""
     <style>
@@ -1,42 +1,42 @@
 import streamlit as st
-import json
 import os
 import time
-from datetime import datetime
-from firebase_config import initialize_firebase, db, firestore
+import threading
+from firebase_config import get_db, firestore
+from leaderboard_index import LeaderboardIndex
+from write_queue import get_write_queue
+from assets import get_icon_data_uri, inject_css
+from question_bank import get_question_bank
+from game_session import GameSession, SESSION_KEY, cleanup_widget_keys
+from score_guard import InvalidScore, ScoreRateLimited, check_rate_limit, validate_game
 
-import base64
 
 # Define base directory where the JSON file is located
 base_dir = os.path.abspath(os.path.dirname(__file__))
-css_path = os.path.join(base_dir, 'style.css')
 
-wa_icon_path = os.path.join(base_dir, 'wa-icon.png')
+wa_icon_name = 'wa-icon.png'  # Served downscaled from the asset cache
 
 
-# Initialize Firebase
-initialize_firebase()
-
-# Function to load questions from a JSON file
+# Function to load the compiled question bank (validated and pre-rendered once per process)
 def load_questions():
-    file_path = os.path.join(base_dir, "questions.json")
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
-
-questions = load_questions()
-
-# Load CSS
-def load_css(file_name):
-    with open(file_name) as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    return get_question_bank()
+
+# How long the answer and explanation stay on screen, and when the toast appears.
+# The reveal is timed by a fragment that reruns on its own, so no server thread
+# sleeps while a player reads it.
+REVEAL_SECONDS = float(os.getenv("QUIZ_REVEAL_SECONDS", "4.5"))
+REVEAL_TOAST_AFTER_SECONDS = float(os.getenv("QUIZ_REVEAL_TOAST_AFTER_SECONDS", "3"))
+REVEAL_POLL_SECONDS = 0.5
+
+# Function to get this browser session's game state (one object under one key)
+def get_game_session():
+    session = st.session_state.get(SESSION_KEY)
+    if session is None:
+        session = st.session_state[SESSION_KEY] = GameSession(load_questions().new_order())
+    return session
 
 def reset_game_state():
-    st.session_state.lives = 5
-    st.session_state.score = 0
-    st.session_state.level = "easy"
-    st.session_state.question_index = 0
-    st.session_state.start_time = None
-    st.session_state.game_started = False
+    get_game_session().reset(load_questions().new_order())
 
 # Function to show toast message
 def show_toast(message):
@@ -48,34 +48,246 @@ def show_toast(message):
     """
     st.markdown(toast_html, unsafe_allow_html=True)
 
+# Process-wide leaderboard cache: the top-N query result is reused by every
+# session for a few seconds, or kept hot by a Firestore listener if enabled
+LEADERBOARD_SIZE = 10
+LEADERBOARD_CACHE_TTL = float(os.getenv("LEADERBOARD_CACHE_TTL", "15"))
+LEADERBOARD_LISTENER = os.getenv("LEADERBOARD_LISTENER", "false").lower() == "true"
+
+_leaderboard_cache = {"entries": None, "fetched_at": 0.0, "live": False}
+_leaderboard_lock = threading.Lock()
+_leaderboard_watch = None
+
+# Scores queued on this node but not committed yet, merged into the top list so
+# a player sees their own result on the game-over screen straight away
+PENDING_SCORE_TTL = 120.0
+_pending_scores = {}  # doc_id -> (queued_at, entry)
+
+# Process-wide rank index over the whole leaderboard, loaded from Firestore on a
+# background thread the first time a leaderboard or rank is shown (ranks are
+# not shown until it is ready). Other server processes save scores too, so the
+# index is rebuilt in the background once it is older than LEADERBOARD_INDEX_TTL
+# seconds (0 disables the refresh); the old index is used until the new one is ready.
+LEADERBOARD_INDEX_TTL = float(os.getenv("LEADERBOARD_INDEX_TTL", "300"))
+
+_leaderboard_index = None
+_leaderboard_index_loaded_at = 0.0
+_leaderboard_index_lock = threading.Lock()
+_leaderboard_index_thread = None
+_scores_during_index_load = None  # Scores saved here while a load runs, added once it finishes
+
+# The shared write queue, once this module's commit listener is registered on it
+_score_queue = None
+
+# Function to get the write queue for scores, registering the commit listener on
+# first use (not at import, so loading the Game page never waits on Firebase)
+def get_score_queue():
+    global _score_queue
+    if _score_queue is None:
+        queue = get_write_queue()
+        with _leaderboard_lock:
+            if _score_queue is None:
+                queue.add_commit_listener(on_writes_committed)
+                _score_queue = queue
+    return _score_queue
+
 # Function to save the score and time to Firestore
-def save_score_to_firestore(nickname, score, total_seconds):
-    doc_ref = db.collection("leaderboard").document()
-    doc_ref.set({
+# (queued, so the game-over screen never waits on Firestore; a game_id makes
+# the write idempotent because it is used as the document id)
+def save_score_to_firestore(nickname, score, total_seconds, game_id=None):
+    doc_id = get_score_queue().enqueue_set("leaderboard", {
         "nickname": nickname,
         "score": score,
         "total_seconds": round(total_seconds, 1),
         "timestamp": firestore.SERVER_TIMESTAMP
-    })
-
-# Function to get the leaderboard from Firestore
+    }, document_id=game_id)
+    entry = {
+        "id": doc_id,
+        "nickname": nickname,
+        "score": score,
+        "total_seconds": round(total_seconds, 1),
+    }
+    with _leaderboard_lock:
+        _pending_scores[doc_id] = (time.monotonic(), entry)
+        if _scores_during_index_load is not None:
+            _scores_during_index_load.append(entry)
+    index = get_leaderboard_index()
+    if index is not None:
+        index.add(doc_id, nickname, score, total_seconds)
+
+# Write-through: once queued scores are committed, the next render fetches the updated top list
+def on_writes_committed(ops):
+    committed = [op["document"] for op in ops if op["collection"] == "leaderboard"]
+    if committed:
+        invalidate_leaderboard_cache()
+        with _leaderboard_lock:
+            for doc_id in committed:
+                _pending_scores.pop(doc_id, None)
+
+# Function to build the ordered top-N leaderboard query
+def leaderboard_query():
+    return get_db().collection("leaderboard").order_by("score", direction=firestore.Query.DESCENDING).order_by("total_seconds").limit(LEADERBOARD_SIZE)
+
+# Function to drop the cached leaderboard (a live listener refreshes itself)
+def invalidate_leaderboard_cache():
+    with _leaderboard_lock:
+        if not _leaderboard_cache["live"]:
+            _leaderboard_cache["entries"] = None
+
+# Listener callback: Firestore pushes the new top-N list whenever it changes
+def on_leaderboard_snapshot(docs, changes, read_time):
+    with _leaderboard_lock:
+        _leaderboard_cache["entries"] = list(docs)
+        _leaderboard_cache["fetched_at"] = time.monotonic()
+        _leaderboard_cache["live"] = True
+
+# Function to start the leaderboard listener once per process
+def start_leaderboard_listener():
+    global _leaderboard_watch
+    with _leaderboard_lock:
+        if _leaderboard_watch is not None:
+            return
+        try:
+            _leaderboard_watch = leaderboard_query().on_snapshot(on_leaderboard_snapshot)
+        except Exception as e:
+            print(f"Error starting leaderboard listener: {e}")
+
+# Function to get the leaderboard, from the cache when it is fresh
 def get_leaderboard():
-    leaderboard_ref = db.collection("leaderboard").order_by("score", direction=firestore.Query.DESCENDING).order_by("total_seconds").limit(10)
-    leaderboard = leaderboard_ref.get()
+    if LEADERBOARD_LISTENER:
+        start_leaderboard_listener()
+
+    with _leaderboard_lock:
+        entries = _leaderboard_cache["entries"]
+        age = time.monotonic() - _leaderboard_cache["fetched_at"]
+        if entries is not None and (_leaderboard_cache["live"] or age < LEADERBOARD_CACHE_TTL):
+            return entries
+
+    leaderboard = list(leaderboard_query().get())
+    with _leaderboard_lock:
+        if not _leaderboard_cache["live"]:
+            _leaderboard_cache["entries"] = leaderboard
+            _leaderboard_cache["fetched_at"] = time.monotonic()
     return leaderboard
 
+# Function to get the top-N entries as dicts, including scores still in the write queue
+def get_leaderboard_entries():
+    entries = {}
+    for doc in get_leaderboard():
+        data = doc.to_dict()
+        entries[doc.id] = {"id": doc.id, "nickname": data.get("nickname"), "score": data.get("score", 0),
+                           "total_seconds": data.get("total_seconds", 0)}
+    now = time.monotonic()
+    with _leaderboard_lock:
+        for doc_id, (queued_at, entry) in list(_pending_scores.items()):
+            if now - queued_at > PENDING_SCORE_TTL:
+                del _pending_scores[doc_id]  # Never committed (dead-lettered); stop showing it
+            else:
+                entries[doc_id] = entry
+    ranked = sorted(entries.values(), key=lambda entry: (-entry["score"], entry["total_seconds"]))
+    return ranked[:LEADERBOARD_SIZE]
+
+# Function to build the rank index from a full scan of the collection (background thread)
+def load_leaderboard_index():
+    global _leaderboard_index, _leaderboard_index_loaded_at, _leaderboard_index_thread, _scores_during_index_load
+    try:
+        index = LeaderboardIndex()
+        for doc in get_db().collection("leaderboard").select(["nickname", "score", "total_seconds"]).stream():
+            data = doc.to_dict()
+            index.add(doc.id, data.get("nickname"), data.get("score", 0), data.get("total_seconds", 0))
+        with _leaderboard_lock:
+            # Scores queued or committed here while the scan ran may not be in it
+            recent = [entry for _, entry in _pending_scores.values()] + _scores_during_index_load
+            for entry in recent:
+                index.add(entry["id"], entry["nickname"], entry["score"], entry["total_seconds"])
+            _leaderboard_index = index
+            _leaderboard_index_loaded_at = time.monotonic()
+        print(f"Leaderboard index loaded ({len(index)} entries).")
+    except Exception as e:
+        print(f"Error loading leaderboard index: {e}")  # Tried again on the next request
+    finally:
+        with _leaderboard_lock:
+            _scores_during_index_load = None
+        with _leaderboard_index_lock:
+            _leaderboard_index_thread = None
+
+# Function to check whether the rank index is missing or due for a refresh
+def leaderboard_index_stale():
+    if _leaderboard_index is None:
+        return True
+    return LEADERBOARD_INDEX_TTL > 0 and time.monotonic() - _leaderboard_index_loaded_at > LEADERBOARD_INDEX_TTL
+
+# Function to start loading (or refreshing) the rank index, off the request path
+def start_leaderboard_index_load():
+    global _leaderboard_index_thread, _scores_during_index_load
+    with _leaderboard_index_lock:
+        if _leaderboard_index_thread is None and leaderboard_index_stale():
+            with _leaderboard_lock:
+                _scores_during_index_load = []
+            _leaderboard_index_thread = threading.Thread(target=load_leaderboard_index, name="leaderboard-index", daemon=True)
+            _leaderboard_index_thread.start()
+
+# Function to get the rank index, or None while the first load is still running
+def get_leaderboard_index():
+    if leaderboard_index_stale():
+        start_leaderboard_index_load()
+    return _leaderboard_index
+
+# Function to show the player's rank among all results
+def show_player_rank(score, total_seconds):
+    index = get_leaderboard_index()
+    if index is None:
+        return  # Still loading; skip the rank rather than wait for the scan
+    rank = index.rank_of(score, total_seconds)
+    percentile = index.percentile(score, total_seconds)
+    st.markdown(f"""
+        <p style='font-size: 1.2rem; font-weight: bold;'>Your rank: #{rank} of {len(index)} (better than {percentile:.0f}% of players)</p>
+    """, unsafe_allow_html=True)
+
 # Function to display the leaderboard
 def show_leaderboard():
     st.title("Live Leaderboard")
-    leaderboard = get_leaderboard()
+    start_leaderboard_index_load()  # So ranks are ready by the time a game ends
+    leaderboard = get_leaderboard_entries()
     leaderboard_html = "<div class='leaderboard-card'>"
-    for idx, entry in enumerate(leaderboard):
-        data = entry.to_dict()
+    for idx, data in enumerate(leaderboard):
         total_seconds_rounded = round(data['total_seconds'], 1)
         leaderboard_html += f"<div class='leaderboard-entry'>{idx + 1}. {data['nickname']} - {data['score']} points - {total_seconds_rounded} seconds</div>"
     leaderboard_html += "</div>"
     st.markdown(leaderboard_html, unsafe_allow_html=True)
 
+# Function to get the visitor's IP address, when the server can see it
+def get_client_ip():
+    context = getattr(st, "context", None)
+    if context is None:
+        return None
+    ip = getattr(context, "ip_address", None)
+    if ip:
+        return ip
+    forwarded = context.headers.get("X-Forwarded-For")
+    return forwarded.split(",")[0].strip() if forwarded else None
+
+# Function to validate a finished game and submit its score once.
+# Returns the play time measured on the server.
+def finish_game(session):
+    questions = load_questions()
+    try:
+        total_seconds = validate_game(session, questions)
+    except InvalidScore as e:
+        print(f"Rejected score for game {session.game_id}: {e}")
+        st.warning("This result could not be verified, so it was not added to the leaderboard.")
+        return session.events[-1][1] - session.events[0][1] if session.events else 0.0
+
+    if not session.submitted:
+        try:
+            check_rate_limit(session.nickname, get_client_ip())
+        except ScoreRateLimited as e:
+            st.warning(str(e))
+            return total_seconds
+        save_score_to_firestore(session.nickname, session.score, total_seconds, game_id=session.game_id)
+        session.submitted = True
+    return total_seconds
+
 # Define your game URL
 game_url = "https://coffee-bean-app-high-v1.streamlit.app/"
 
@@ -86,64 +298,75 @@ def generate_share_link(score, nickname):
 
     return whatsapp_url
 
-# Function to encode image to base64
-def get_base64_image(image_path):
-    with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
-    return encoded_string
+# Function to show the result of the last answer until its reveal time is up.
+# Reruns by itself every REVEAL_POLL_SECONDS and then reruns the whole page
+# to move on to the next question (or the game over screen).
+@st.fragment(run_every=REVEAL_POLL_SECONDS)
+def show_answer_reveal():
+    session = get_game_session()
+    reveal = session.reveal
+    if reveal is None:
+        return
+    elapsed = time.monotonic() - reveal["shown_at"]
+    if elapsed >= REVEAL_SECONDS:
+        session.reveal = None
+        st.rerun()
+
+    if reveal["correct"]:
+        st.success("Correct!")
+    else:
+        st.error(f"Incorrect! The correct answer is: {reveal['answer']}")
+
+    st.write(f"**Explanation:** {reveal['explanation']}")
+
+    if elapsed >= REVEAL_TOAST_AFTER_SECONDS:
+        show_toast("Proceeding to next question")
 
 ####################### START THE GAME #################################
 def show_game_page():
     st.title("Coffee Quiz Game")
 
-    # Load custom CSS
-    load_css(css_path)
+    # Load custom CSS (once per run)
+    inject_css()
 
-    if 'game_started' not in st.session_state:
-        reset_game_state()
+    session = get_game_session()
 
-    if not st.session_state.game_started:
+    # Drop widget state from questions that were already answered
+    cleanup_widget_keys(st.session_state, keep=(session.answer_key, session.submit_key))
+
+    if not session.started:
         with st.form("nickname_form"):
             nickname = st.text_input("Enter your nickname:")
             submit_button = st.form_submit_button("Start Game")
             if submit_button and nickname:
-                st.session_state.nickname = nickname
-                st.session_state.start_time = datetime.now()
-                st.session_state.game_started = True
+                session.start(nickname)
                 st.rerun()
         show_leaderboard()
 
-    if st.session_state.game_started:
-        lives = st.session_state.lives
-        score = st.session_state.score
-        level = st.session_state.level
-        question_index = st.session_state.question_index
+    if session.started and session.reveal is not None:
+        # Still showing the last answer; the next question comes when the reveal ends
+        show_answer_reveal()
+
+    elif session.started:
+        lives = session.lives
+        score = session.score
+        level = session.level
+        question_index = session.question_index
 
         if level:
-            current_questions = questions[level]
+            questions = load_questions()
 
-            if question_index < len(current_questions) and lives > 0:
-                q = current_questions[question_index]
+            if question_index < questions.questions_in_level(level) and lives > 0:
+                q = session.current_question(questions)
+                session.mark_shown(q.id)
 
                 # Displaying current level and question with larger font size
-                st.markdown(f"""
-                    <p style='font-size: 1.2rem; font-weight: bold;'>Current Level: &nbsp;{level.upper()}</p>
-                    <p style='font-size: 1.2rem; font-weight: bold;'>Question: &nbsp;{question_index + 1}/{len(current_questions)}</p>
-                """, unsafe_allow_html=True)
+                st.markdown(questions.header_html(level, question_index), unsafe_allow_html=True)
 
                 # Display hearts for lives
-                st.markdown(
-                    f"<p class='hearts'>{'❤️' * lives} {'🤍' * (5 - lives)}</p>", 
-                    unsafe_allow_html=True
-                )
+                st.markdown(questions.hearts_html(lives), unsafe_allow_html=True)
 
-                st.markdown(
-                    f"""
-                    <div class="question-container">
-                        <p class="question-text">{q["question"]}</p>
-                    </div>
-                    """, unsafe_allow_html=True
-                )
+                st.markdown(q.html, unsafe_allow_html=True)
 
                 # Display bold text with inline CSS
                 st.markdown("""
@@ -152,62 +375,44 @@ def show_game_page():
 
                 
                 # Radio button widget
-                answer = st.radio("", q["options"], key=f"q{question_index}")
-
-                if st.button("Submit Answer", key=f"submit{question_index}"):
-                    if answer == q["answer"]:
-                        st.success("Correct!")
-                    else:
-                        st.error(f"Incorrect! The correct answer is: {q['answer']}")
-
-                    st.write(f"**Explanation:** {q['explanation']}")
-
-                    # Show success or error message for a short duration
-                    time.sleep(3)
-                    show_toast("Proceeding to next question")
-                    time.sleep(1.5)
-
-                    score += 1 if answer == q["answer"] else 0
-                    lives -= 1 if answer != q["answer"] else 0
-
-                    st.session_state.lives = lives
-                    st.session_state.score = score
-                    st.session_state.question_index += 1
-
-                    if st.session_state.question_index >= len(current_questions):
-                        if level == "easy":
-                            st.session_state.level = "medium"
-                        elif level == "medium":
-                            st.session_state.level = "hard"
-                        else:
-                            st.session_state.level = None
-                        st.session_state.question_index = 0
+                answer = st.radio("", q.options, key=session.answer_key)
+
+                if st.button("Submit Answer", key=session.submit_key):
+                    # Record the outcome now and reveal it on the next runs
+                    correct = answer == q.answer
+                    session.reveal = {
+                        "correct": correct,
+                        "answer": q.answer,
+                        "explanation": q.explanation,
+                        "shown_at": time.monotonic(),
+                    }
+                    session.record_answer(correct, questions, q.id)
                     st.rerun()
 
             else:
                 ################# IF LOSE THE GAME #####################
-                total_time = (datetime.now() - st.session_state.start_time).total_seconds()
-                save_score_to_firestore(st.session_state.nickname, score, total_time)
+                total_time = finish_game(session)
                 # Display the final score and time taken with larger font
                 st.markdown(f"""
                     <p style='font-size: 1.5rem; font-weight: bold;'>Game Over!</p>
                     <p style='font-size: 1.5rem; font-weight: bold;'>Your final score is: {score}</p>
                     <p style='font-size: 1.5rem; font-weight: bold;'>Time taken: {total_time:.1f} seconds</p>
                 """, unsafe_allow_html=True)
+                show_player_rank(score, total_time)
                 st.snow()
                 show_leaderboard()
                 
-                st.session_state.game_started = False
+                session.started = False
                 # Generate share links if nickname is not None
-                if st.session_state.nickname:
-                    whatsapp_link = generate_share_link(score, st.session_state.nickname)
-                    wa_icon_base64 = get_base64_image(wa_icon_path)
+                if session.nickname:
+                    whatsapp_link = generate_share_link(score, session.nickname)
+                    wa_icon_uri = get_icon_data_uri(wa_icon_name)
                     st.markdown(
                         f"""
                         <div>
                             <h3>Share your achievement!</h3>
                             <a href="{whatsapp_link}" target="_blank" class="social-button">
-                                <img src="data:image/png;base64,{wa_icon_base64}" alt="WhatsApp" width="20" height="20">
+                                <img src="{wa_icon_uri}" alt="WhatsApp" width="20" height="20">
                                 Share on WhatsApp
                         </div>
                         """, unsafe_allow_html=True
@@ -220,27 +425,27 @@ def show_game_page():
 
         else:
             ################# IF WIN THE GAME #####################
-            total_time = (datetime.now() - st.session_state.start_time).total_seconds()
-            save_score_to_firestore(st.session_state.nickname, score, total_time)
+            total_time = finish_game(session)
             # Display the final score and time taken with larger font
             st.markdown(f"""
                 <p style='font-size: 1.5rem; font-weight: bold;'>Congratulations!</p>
                 <p style='font-size: 1.5rem; font-weight: bold;'>Your final score is: {score}</p>
                 <p style='font-size: 1.5rem; font-weight: bold;'>Time taken: {total_time:.1f} seconds</p>
             """, unsafe_allow_html=True)
+            show_player_rank(score, total_time)
             st.balloons()
             show_leaderboard()
-            st.session_state.game_started = False
+            session.started = False
             # Generate share links if nickname is not None
-            if st.session_state.nickname:
-                whatsapp_link = generate_share_link(score, st.session_state.nickname)
-                wa_icon_base64 = get_base64_image(wa_icon_path)
+            if session.nickname:
+                whatsapp_link = generate_share_link(score, session.nickname)
+                wa_icon_uri = get_icon_data_uri(wa_icon_name)
                 st.markdown(
                     f"""
                     <div>
                         <h4>Share your achievement!</h4>
                         <a href="{whatsapp_link}" target="_blank" class="social-button">
-                            <img src="data:image/png;base64,{wa_icon_base64}" alt="WhatsApp" width="20" height="20">
+                            <img src="{wa_icon_uri}" alt="WhatsApp" width="20" height="20">
                             Share on WhatsApp
                     </div>
                     """, unsafe_allow_html=True
@@ -253,7 +458,7 @@ def show_game_page():
 
         # Reset the game state and clear the nickname
         if st.button("Play Again"):
-            st.session_state.nickname = None
+            session.nickname = None
             reset_game_state()
             st.rerun()
 
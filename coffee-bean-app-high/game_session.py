@@ -0,0 +1,143 @@
+import re
+import time
+import uuid
+from datetime import datetime
+
+from question_bank import MAX_LIVES, QUIZ_ADAPTIVE, target_difficulty
+
+# Quiz state for one browser session.
+# Everything the game tracks lives in one GameSession stored under a single
+# session_state key, instead of a separate key per field, and the answer
+# widgets use keys derived from the answer count that are removed once the
+# question is answered. A session's footprint stays the same however many
+# games are played. to_dict()/from_dict() give a plain JSON-friendly snapshot.
+#
+# Each game also keeps an event log on the monotonic clock, one entry per
+# step: ("start", t), ("shown", t, question_id) and
+# ("answer", t, question_id, correct). score_guard validates it before a result
+# is saved, and game_id doubles as the leaderboard document id so saving the
+# same game twice writes the same document.
+
+SESSION_KEY = "quiz_game"
+
+_WIDGET_KEY = re.compile(r"^(quiz_answer_|quiz_submit_)\d+$|^(q|submit)\d+$")
+
+
+class GameSession:
+    __slots__ = ("nickname", "lives", "score", "level", "question_index", "question_order",
+                 "streak", "answered", "start_time", "started", "reveal", "game_id", "events", "submitted")
+
+    def __init__(self, question_order=None, nickname=None):
+        self.nickname = nickname
+        self.reset(question_order)
+
+    # Function to start over at the first level, keeping the nickname
+    def reset(self, question_order):
+        self.lives = MAX_LIVES
+        self.score = 0
+        self.level = "easy"
+        self.question_index = 0
+        self.question_order = question_order
+        self.streak = 0
+        self.answered = 0
+        self.start_time = None
+        self.started = False
+        self.reveal = None
+        self.game_id = None
+        self.events = []
+        self.submitted = False
+
+    def start(self, nickname):
+        self.nickname = nickname
+        self.start_time = datetime.now()
+        self.started = True
+        self.game_id = uuid.uuid4().hex
+        self.events = [("start", time.monotonic())]
+
+    # Function to log when a question first appears on screen
+    def mark_shown(self, question_id):
+        last = self.events[-1] if self.events else None
+        if last is None or last[0] != "shown" or last[2] != question_id:
+            self.events.append(("shown", time.monotonic(), question_id))
+
+    # Function to get the question to show: the next one in the game's order, or
+    # in adaptive mode the one picked for the player's streak (kept until answered)
+    def current_question(self, questions, adaptive=QUIZ_ADAPTIVE):
+        seed = self.question_order[self.level]
+        if not adaptive:
+            return questions.question(self.level, seed, self.question_index)
+        last = self.events[-1] if self.events else None
+        if last is not None and last[0] == "shown":
+            return questions.questions[last[2]]
+        asked = {event[2] for event in self.events if event[0] == "shown"}
+        last_correct = next((event[3] for event in reversed(self.events) if event[0] == "answer"), None)
+        return questions.next_question(self.level, seed, asked, target_difficulty(self.streak, last_correct))
+
+    # Function to apply one answer and move through the levels
+    def record_answer(self, correct, questions, question_id=None):
+        self.events.append(("answer", time.monotonic(), question_id, correct))
+        if question_id is not None:
+            questions.record_result(question_id, correct)
+        self.score += 1 if correct else 0
+        self.lives -= 1 if not correct else 0
+        self.streak = self.streak + 1 if correct else 0
+        self.question_index += 1
+        self.answered += 1
+        if questions.level_finished(self.level, self.question_index, self.streak):
+            self.level = questions.next_level(self.level)
+            self.question_index = 0
+            self.streak = 0
+
+    # Widget keys for the question on screen
+    @property
+    def answer_key(self):
+        return f"quiz_answer_{self.answered}"
+
+    @property
+    def submit_key(self):
+        return f"quiz_submit_{self.answered}"
+
+    def to_dict(self):
+        return {
+            "nickname": self.nickname,
+            "lives": self.lives,
+            "score": self.score,
+            "level": self.level,
+            "question_index": self.question_index,
+            "question_order": dict(self.question_order or {}),
+            "streak": self.streak,
+            "answered": self.answered,
+            "start_time": self.start_time.isoformat() if self.start_time else None,
+            "started": self.started,
+            "reveal": dict(self.reveal) if self.reveal else None,
+            "game_id": self.game_id,
+            "events": [list(event) for event in self.events],
+            "submitted": self.submitted,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        session = cls.__new__(cls)
+        session.nickname = data.get("nickname")
+        session.lives = data.get("lives", MAX_LIVES)
+        session.score = data.get("score", 0)
+        session.level = data.get("level", "easy")
+        session.question_index = data.get("question_index", 0)
+        session.question_order = dict(data.get("question_order") or {})
+        session.streak = data.get("streak", 0)
+        session.answered = data.get("answered", 0)
+        start_time = data.get("start_time")
+        session.start_time = datetime.fromisoformat(start_time) if start_time else None
+        session.started = data.get("started", False)
+        session.reveal = data.get("reveal")
+        session.game_id = data.get("game_id")
+        session.events = [tuple(event) for event in data.get("events", ())]
+        session.submitted = data.get("submitted", False)
+        return session
+
+
+# Function to remove answer widget state left over from earlier questions
+def cleanup_widget_keys(session_state, keep=()):
+    for key in list(session_state.keys()):
+        if isinstance(key, str) and key not in keep and _WIDGET_KEY.match(key):
+            del session_state[key]
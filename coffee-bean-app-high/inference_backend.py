@@ -0,0 +1,109 @@
+import os
+import threading
+
+from ultralytics import YOLO
+
+# Selectable CPU inference backend for the YOLO weights.
+# The .pt weights are exported once to ONNX (optionally INT8-quantized) or
+# OpenVINO and the artifact is cached next to them; it is re-exported only when
+# the weights are newer. Ultralytics loads every format through the same YOLO
+# class, so predict() keeps returning the usual Results objects and callers do
+# not need to know which runtime is underneath.
+#
+#   INFERENCE_BACKEND=torch      PyTorch (default)
+#   INFERENCE_BACKEND=onnx       ONNX Runtime, FP32
+#   INFERENCE_BACKEND=onnx-int8  ONNX Runtime, dynamically quantized INT8 weights
+#   INFERENCE_BACKEND=openvino   OpenVINO IR
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino")
+
+# ONNX Runtime thread pools (0 lets the runtime pick)
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "0"))
+
+EXPORT_IMAGE_SIZE = 640
+
+_export_lock = threading.Lock()
+
+
+# Function to check whether an exported artifact is missing or older than the weights
+def is_stale(artifact_path, weights_path):
+    return not os.path.exists(artifact_path) or os.path.getmtime(artifact_path) < os.path.getmtime(weights_path)
+
+
+def export_onnx(weights_path, image_size=EXPORT_IMAGE_SIZE):
+    # Dynamic axes so the batching server can send more than one image per call
+    return YOLO(weights_path).export(format="onnx", imgsz=image_size, dynamic=True, simplify=True)
+
+
+def quantize_onnx(onnx_path, int8_path):
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise RuntimeError("INT8 quantization requires the onnxruntime package.") from e
+
+    tmp_path = f"{int8_path}.tmp"
+    quantize_dynamic(onnx_path, tmp_path, weight_type=QuantType.QUInt8)
+    os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+def export_openvino(weights_path, image_size=EXPORT_IMAGE_SIZE):
+    return YOLO(weights_path).export(format="openvino", imgsz=image_size, dynamic=True)
+
+
+# Function to get the model file to load for a backend, exporting it on first use
+def resolve_model_artifact(weights_path, backend=INFERENCE_BACKEND):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {', '.join(BACKENDS)}.")
+    if backend == "torch":
+        return weights_path
+
+    stem, _ = os.path.splitext(weights_path)
+    with _export_lock:
+        if backend in ("onnx", "onnx-int8"):
+            onnx_path = f"{stem}.onnx"
+            if is_stale(onnx_path, weights_path):
+                print(f"Exporting {weights_path} to ONNX...")
+                onnx_path = export_onnx(weights_path)
+            if backend == "onnx":
+                return onnx_path
+
+            int8_path = f"{stem}.int8.onnx"
+            if is_stale(int8_path, onnx_path):
+                print(f"Quantizing {onnx_path} to INT8...")
+                quantize_onnx(onnx_path, int8_path)
+            return int8_path
+
+        openvino_dir = f"{stem}_openvino_model"
+        if is_stale(openvino_dir, weights_path):
+            print(f"Exporting {weights_path} to OpenVINO...")
+            openvino_dir = export_openvino(weights_path)
+        return openvino_dir
+
+
+# Function to rebuild the ONNX Runtime session of a loaded model with our thread settings.
+# Ultralytics creates the session on the first predict() with default options,
+# so this must run after warmup.
+def configure_onnx_session(model, onnx_path, intra_op_threads=ONNX_INTRA_OP_THREADS, inter_op_threads=ONNX_INTER_OP_THREADS):
+    if not intra_op_threads and not inter_op_threads:
+        return False
+
+    backend = getattr(getattr(model, "predictor", None), "model", None)
+    session = getattr(backend, "session", None)
+    if session is None or not hasattr(session, "get_providers"):
+        return False
+
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if intra_op_threads:
+        options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads:
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    backend.session = onnxruntime.InferenceSession(onnx_path, sess_options=options, providers=session.get_providers())
+    return True
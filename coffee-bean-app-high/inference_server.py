@@ -0,0 +1,118 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Micro-batching front end for a shared YOLO model.
+# Requests from every Streamlit session and WebRTC stream are queued; a single
+# worker thread collects up to max_batch_size images (waiting at most
+# max_wait_ms after the first one arrives) and runs them through the model as
+# one batch. Each caller gets back only the Results for its own image.
+# Running all inference on one thread also keeps the shared model, which is not
+# thread-safe, away from concurrent predict() calls.
+
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+
+
+class BatchingInferenceServer:
+    def __init__(self, model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS, **predict_kwargs):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.predict_kwargs = {"save": False, "verbose": False, **predict_kwargs}
+
+        # Counters for monitoring how well requests are being coalesced
+        self.batches_run = 0
+        self.images_processed = 0
+
+        self._requests = queue.Queue()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="yolo-batching-server", daemon=True)
+        self._worker.start()
+
+    # Queue one image and return a Future resolving to its list of Results
+    def submit(self, image):
+        if self._stopped.is_set():
+            raise RuntimeError("Inference server has been stopped.")
+        future = Future()
+        self._requests.put((image, future))
+        return future
+
+    # Blocking helper mirroring model.predict(source=image)
+    def predict(self, image, timeout=None):
+        return self.submit(image).result(timeout=timeout)
+
+    def stop(self):
+        self._stopped.set()
+        self._requests.put(None)
+        self._worker.join()
+
+    def _collect_batch(self):
+        first = self._requests.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop requested: finish the current batch, then exit
+                self._requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if not batch:
+                break
+
+            # Drop requests whose caller has already given up
+            batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            images = [image for image, _ in batch]
+            try:
+                results = self.model.predict(source=images, **self.predict_kwargs)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.images_processed += len(batch)
+            for (_, future), result in zip(batch, results):
+                # Keep the same shape as model.predict() on a single image
+                future.set_result([result])
+
+        # Fail anything still queued after shutdown
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("Inference server has been stopped."))
+
+
+# One server per model, shared process-wide like the models themselves
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+# Function to get (or start) the batching server for a model
+def get_inference_server(model, **kwargs):
+    with _servers_lock:
+        server = _servers.get(id(model))
+        if server is None:
+            server = BatchingInferenceServer(model, **kwargs)
+            _servers[id(model)] = server
+        return server
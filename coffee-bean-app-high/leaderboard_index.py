@@ -0,0 +1,180 @@
+import random
+import threading
+
+# In-process order-statistics index over the leaderboard.
+# Entries are kept in an indexable skip list ordered by (-score, total_seconds),
+# where every forward link also records how many entries it skips. That gives
+# O(log n) inserts, removals, rank lookups and access by position, so top-K,
+# "what rank is this result" and percentile queries never need a full scan of
+# the Firestore collection.
+
+_MAX_LEVELS = 32
+_LAST_ID = chr(0x10FFFF)  # Sorts after every document id, for "ties included" lookups
+
+
+class _Node:
+    __slots__ = ("key", "value", "next", "width")
+
+    def __init__(self, key, value, levels):
+        self.key = key
+        self.value = value
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+class IndexableSkipList:
+    def __init__(self):
+        self._head = _Node(None, None, _MAX_LEVELS)
+        self._levels = 1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _random_levels(self):
+        levels = 1
+        while levels < _MAX_LEVELS and random.random() < 0.5:
+            levels += 1
+        return levels
+
+    def insert(self, key, value):
+        chain = [None] * _MAX_LEVELS
+        steps_at_level = [0] * _MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self._levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self._random_levels()
+        if levels > self._levels:
+            for level in range(self._levels, levels):
+                chain[level] = self._head
+                self._head.width[level] = self._size + 1
+            self._levels = levels
+
+        new_node = _Node(key, value, levels)
+        steps = 0
+        for level in range(levels):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self._levels):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain = [None] * _MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self._levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+
+        for level in range(self._levels):
+            previous = chain[level]
+            if previous.next[level] is target:
+                previous.width[level] += target.width[level] - 1
+                previous.next[level] = target.next[level]
+            else:
+                previous.width[level] -= 1
+        self._size -= 1
+
+    # Number of entries whose key is strictly less than key
+    def count_less(self, key):
+        position = 0
+        node = self._head
+        for level in reversed(range(self._levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    # Iterate over (key, value) pairs starting at a 0-based position
+    def iter_from(self, index):
+        if index < 0 or index >= self._size:
+            return
+        node = self._head
+        remaining = index + 1
+        for level in reversed(range(self._levels)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        while node is not None:
+            yield node.key, node.value
+            node = node.next[0]
+
+
+class LeaderboardIndex:
+    def __init__(self):
+        self._entries = IndexableSkipList()
+        self._keys_by_id = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(score, total_seconds, doc_id=""):
+        return (-score, total_seconds, doc_id)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Add or replace one leaderboard entry
+    def add(self, doc_id, nickname, score, total_seconds):
+        key = self._key(score, round(total_seconds, 1), doc_id)
+        value = {"id": doc_id, "nickname": nickname, "score": score, "total_seconds": round(total_seconds, 1)}
+        with self._lock:
+            old_key = self._keys_by_id.pop(doc_id, None)
+            if old_key is not None:
+                self._entries.remove(old_key)
+            self._entries.insert(key, value)
+            self._keys_by_id[doc_id] = key
+
+    def remove(self, doc_id):
+        with self._lock:
+            key = self._keys_by_id.pop(doc_id, None)
+            if key is not None:
+                self._entries.remove(key)
+
+    def top(self, k):
+        return self.page(1, k)["entries"]
+
+    # Page through the ranking (pages are 1-based); each entry carries its rank
+    def page(self, page, page_size=10):
+        page, page_size = max(1, page), max(1, page_size)
+        start = (page - 1) * page_size
+        with self._lock:
+            total = len(self._entries)
+            entries = []
+            for offset, (_, value) in enumerate(self._entries.iter_from(start)):
+                if offset >= page_size:
+                    break
+                entries.append({**value, "rank": start + offset + 1})
+        return {
+            "entries": entries,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "pages": (total + page_size - 1) // page_size,
+        }
+
+    # Rank a result would have (1-based; ties share the best rank)
+    def rank_of(self, score, total_seconds):
+        with self._lock:
+            return self._entries.count_less(self._key(score, round(total_seconds, 1))) + 1
+
+    # Percentage of entries this result beats outright
+    def percentile(self, score, total_seconds):
+        with self._lock:
+            total = len(self._entries)
+            if total == 0:
+                return 100.0
+            at_or_above = self._entries.count_less(self._key(score, round(total_seconds, 1), _LAST_ID))
+            return 100.0 * (total - at_or_above) / total
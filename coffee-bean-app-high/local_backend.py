@@ -0,0 +1,313 @@
+import copy
+import random
+import string
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+from firebase_admin.auth import EmailAlreadyExistsError, InvalidIdTokenError, UserNotFoundError
+
+# In-memory stand-in for the parts of Firestore and Firebase Auth this app
+# uses, for offline load testing and benchmarking. Select it with
+# FIREBASE_BACKEND=memory; FIREBASE_FAKE_LATENCY_MS adds a simulated round trip
+# (plus up to FIREBASE_FAKE_JITTER_MS of random jitter) to every call that
+# would hit the network. Data lives only as long as the process.
+
+
+class FakeLatency:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0):
+        self.latency = max(0.0, latency_ms) / 1000.0
+        self.jitter = max(0.0, jitter_ms) / 1000.0
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        delay = self.latency + (random.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+
+def _auto_id():
+    alphabet = string.ascii_letters + string.digits
+    return "".join(random.choice(alphabet) for _ in range(20))
+
+
+def _resolve_sentinels(data):
+    now = datetime.now(timezone.utc)
+    return {key: now if value is firestore.SERVER_TIMESTAMP else copy.deepcopy(value) for key, value in data.items()}
+
+
+class LocalDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class LocalDocumentReference:
+    def __init__(self, store, collection, document_id):
+        self._store = store
+        self._collection = collection
+        self.id = document_id
+
+    def set(self, data, merge=False):
+        self._store.latency()
+        self._store.write(self._collection, self.id, data, merge)
+
+    def update(self, data):
+        self._store.latency()
+        if self._store.read(self._collection, self.id) is None:
+            raise KeyError(f"No document to update: {self._collection}/{self.id}")
+        self._store.write(self._collection, self.id, data, merge=True)
+
+    def get(self):
+        self._store.latency()
+        return LocalDocumentSnapshot(self, self._store.read(self._collection, self.id))
+
+    def delete(self):
+        self._store.latency()
+        self._store.delete(self._collection, self.id)
+
+
+class LocalQuery:
+    def __init__(self, store, collection, orders=(), limit_count=None, fields=None):
+        self._store = store
+        self._collection = collection
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._fields = fields
+
+    def order_by(self, field, direction=firestore.Query.ASCENDING):
+        return LocalQuery(self._store, self._collection, self._orders + ((field, direction),), self._limit, self._fields)
+
+    def limit(self, count):
+        return LocalQuery(self._store, self._collection, self._orders, count, self._fields)
+
+    def select(self, fields):
+        return LocalQuery(self._store, self._collection, self._orders, self._limit, list(fields))
+
+    def _run(self):
+        items = self._store.items(self._collection)
+        # Stable sorts applied from the last order_by to the first
+        for field, direction in reversed(self._orders):
+            items = [item for item in items if field in item[1]]
+            items.sort(key=lambda item: item[1][field], reverse=direction == firestore.Query.DESCENDING)
+        if self._limit is not None:
+            items = items[:self._limit]
+        snapshots = []
+        for document_id, data in items:
+            if self._fields is not None:
+                data = {key: value for key, value in data.items() if key in self._fields}
+            reference = LocalDocumentReference(self._store, self._collection, document_id)
+            snapshots.append(LocalDocumentSnapshot(reference, data))
+        return snapshots
+
+    def get(self):
+        self._store.latency()
+        return self._run()
+
+    def stream(self):
+        self._store.latency()
+        yield from self._run()
+
+    def on_snapshot(self, callback):
+        return self._store.watch(self, callback)
+
+
+class LocalCollectionReference(LocalQuery):
+    def __init__(self, store, collection):
+        super().__init__(store, collection)
+        self.id = collection
+
+    def document(self, document_id=None):
+        return LocalDocumentReference(self._store, self._collection, document_id or _auto_id())
+
+    def add(self, data):
+        reference = self.document()
+        reference.set(data)
+        return datetime.now(timezone.utc), reference
+
+
+class LocalWriteBatch:
+    def __init__(self, store):
+        self._store = store
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(("set", reference, data, merge))
+
+    def delete(self, reference):
+        self._ops.append(("delete", reference, None, False))
+
+    def commit(self):
+        self._store.latency()
+        for op, reference, data, merge in self._ops:
+            if op == "set":
+                self._store.write(reference._collection, reference.id, data, merge)
+            else:
+                self._store.delete(reference._collection, reference.id)
+        self._ops = []
+
+
+class LocalWatch:
+    def __init__(self, store, query, callback):
+        self._store = store
+        self.query = query
+        self.callback = callback
+
+    def unsubscribe(self):
+        self._store.unwatch(self)
+
+
+class LocalFirestore:
+    def __init__(self, latency=None):
+        self.latency = latency or FakeLatency()
+        self._collections = {}
+        self._watches = []
+        self._lock = threading.RLock()
+
+    def collection(self, name):
+        return LocalCollectionReference(self, name)
+
+    def batch(self):
+        return LocalWriteBatch(self)
+
+    def read(self, collection, document_id):
+        with self._lock:
+            data = self._collections.get(collection, {}).get(document_id)
+            return copy.deepcopy(data) if data is not None else None
+
+    def items(self, collection):
+        with self._lock:
+            return [(document_id, copy.deepcopy(data)) for document_id, data in self._collections.get(collection, {}).items()]
+
+    def write(self, collection, document_id, data, merge=False):
+        with self._lock:
+            documents = self._collections.setdefault(collection, {})
+            resolved = _resolve_sentinels(data)
+            if merge and document_id in documents:
+                documents[document_id].update(resolved)
+            else:
+                documents[document_id] = resolved
+        self._notify(collection)
+
+    def delete(self, collection, document_id):
+        with self._lock:
+            self._collections.get(collection, {}).pop(document_id, None)
+        self._notify(collection)
+
+    def watch(self, query, callback):
+        watch = LocalWatch(self, query, callback)
+        with self._lock:
+            self._watches.append(watch)
+        self._fire(watch)
+        return watch
+
+    def unwatch(self, watch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self, collection):
+        with self._lock:
+            watches = [watch for watch in self._watches if watch.query._collection == collection]
+        for watch in watches:
+            self._fire(watch)
+
+    def _fire(self, watch):
+        # Like Firestore, deliver snapshots on a background thread
+        docs = watch.query._run()
+        threading.Thread(target=watch.callback, args=(docs, [], datetime.now(timezone.utc)), daemon=True).start()
+
+
+class LocalUserRecord:
+    def __init__(self, uid, email, display_name=None, photo_url=None, password=None, disabled=False):
+        self.uid = uid
+        self.email = email
+        self.display_name = display_name
+        self.photo_url = photo_url
+        self.password = password
+        self.disabled = disabled
+
+
+class LocalAuth:
+    # Same names as firebase_admin.auth, so `except auth.UserNotFoundError` keeps working
+    UserNotFoundError = UserNotFoundError
+    EmailAlreadyExistsError = EmailAlreadyExistsError
+
+    def __init__(self, latency=None):
+        self.latency = latency or FakeLatency()
+        self._users = {}
+        self._uids_by_email = {}
+        self._lock = threading.Lock()
+
+    def create_user(self, email=None, password=None, display_name=None, photo_url=None, uid=None, **kwargs):
+        self.latency()
+        with self._lock:
+            if email in self._uids_by_email:
+                raise EmailAlreadyExistsError(f"The user with the provided email already exists ({email}).", None, None)
+            uid = uid or uuid.uuid4().hex[:28]
+            user = LocalUserRecord(uid, email, display_name, photo_url, password, kwargs.get("disabled", False))
+            self._users[uid] = user
+            if email:
+                self._uids_by_email[email] = uid
+            return user
+
+    def get_user(self, uid):
+        self.latency()
+        with self._lock:
+            user = self._users.get(uid)
+        if user is None:
+            raise UserNotFoundError(f"No user record found for the provided user ID: {uid}.")
+        return user
+
+    def get_user_by_email(self, email):
+        self.latency()
+        with self._lock:
+            uid = self._uids_by_email.get(email)
+            user = self._users.get(uid) if uid else None
+        if user is None:
+            raise UserNotFoundError(f"No user record found for the provided email: {email}.")
+        return user
+
+    def update_user(self, uid, **kwargs):
+        self.latency()
+        with self._lock:
+            user = self._users.get(uid)
+            if user is None:
+                raise UserNotFoundError(f"No user record found for the provided user ID: {uid}.")
+            if "email" in kwargs and kwargs["email"] != user.email:
+                self._uids_by_email.pop(user.email, None)
+                self._uids_by_email[kwargs["email"]] = uid
+            for field in ("email", "password", "display_name", "photo_url", "disabled"):
+                if field in kwargs:
+                    setattr(user, field, kwargs[field])
+            return user
+
+    def delete_user(self, uid):
+        self.latency()
+        with self._lock:
+            user = self._users.pop(uid, None)
+            if user is None:
+                raise UserNotFoundError(f"No user record found for the provided user ID: {uid}.")
+            self._uids_by_email.pop(user.email, None)
+
+    def verify_id_token(self, id_token):
+        # There are no real ID tokens offline: accept the uid of a known user
+        with self._lock:
+            user = self._users.get(id_token)
+        if user is None:
+            raise InvalidIdTokenError("Unknown local ID token.")
+        return {"uid": user.uid, "email": user.email}
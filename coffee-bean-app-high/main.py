@@ -1,13 +1,18 @@
 import streamlit as st
 import os
 from streamlit_option_menu import option_menu
-from firebase_config import initialize_firebase, create_user_with_email_password, verify_user_with_email_password, db
+from firebase_config import start_firebase_prewarm, create_user_with_email_password, verify_user_with_email_password, get_db, get_auth
+from firebase_config import get_firebase_health, is_firebase_ready
 
 # IMPORT LIBRARIES FOR GOOGLE AUTHENTICATION
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from google_auth_oauthlib.flow import Flow
-from firebase_admin import auth, firestore
+from firebase_admin import firestore
+from profile_cache import get_user_profile, invalidate_user_profile, profile_needs_update
+from assets import begin_run, get_html, inject_css, preload_icons
+from model_registry import start_model_prewarm
+from bean_detection import model_path
 import json
 
 import webbrowser
@@ -17,8 +22,14 @@ if os.path.exists('.env'):
     from dotenv import load_dotenv
     load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 
-# Initialize Firebase SDK
-initialize_firebase()
+# Connect to Firebase in the background; pages initialize it lazily on first use
+start_firebase_prewarm()
+
+# Load and warm the bean model in the background so the Predict page does not pay for it
+start_model_prewarm(model_path)
+
+# Optimize inline icons once per process (cached after the first run)
+preload_icons()
 
 # Determine the environment based on the URL
 base_url = os.getenv("BASE_URL_DEV") if os.getenv("ENVIRONMENT") == 'development' else os.getenv("BASE_URL_PROD")
@@ -56,9 +67,7 @@ def show_landing_page():
     
 
     
-    landing_html_path = os.path.join(base_dir, 'landing.html')
-    with open(landing_html_path, 'r', encoding='utf-8') as file:
-        landing_html = file.read()
+    landing_html = get_html('landing.html')
     
     st.html(landing_html)
     #st.markdown('<div class="custom-card">', unsafe_allow_html=True)
@@ -70,9 +79,9 @@ def show_landing_page():
 
 def exchange_code_for_token(code):
     
-    # Ensure Firebase is initialized
-    if db is None:
-        initialize_firebase()
+    # Firebase clients (initialized on first use)
+    db = get_db()
+    auth = get_auth()
         
     # Set up the OAuth 2.0 flow using environment variables and base_url
     flow = Flow.from_client_config(
@@ -111,17 +120,20 @@ def exchange_code_for_token(code):
             photo_url=id_info.get('picture')
         )
     
-    # Store user details in Firestore
-    user_ref = db.collection("users").document(firebase_user.uid)
+    # Store user details in Firestore, skipping the write when nothing changed
     user_data = {
         "email": firebase_user.email,
         "uid": firebase_user.uid,
         "display_name": firebase_user.display_name,
         "photo_url": firebase_user.photo_url,
-        "createdAt": firestore.SERVER_TIMESTAMP  # Add the createdAt timestamp
     }
-    
-    user_ref.set(user_data, merge=True)  # Merge with existing data if any
+    profile = get_user_profile(firebase_user.uid)
+    if profile_needs_update(profile, user_data):
+        if profile is None or "createdAt" not in profile:
+            user_data["createdAt"] = firestore.SERVER_TIMESTAMP  # Add the createdAt timestamp
+        user_ref = db.collection("users").document(firebase_user.uid)
+        user_ref.set(user_data, merge=True)  # Merge with existing data if any
+        invalidate_user_profile(firebase_user.uid)
     
     # Update session state
     st.session_state["user_id"] = firebase_user.uid
@@ -259,17 +271,9 @@ def show_register_page():
         st.error("Google Client ID not found. Please set the GOOGLE_CLIENT_ID environment variable.")
         
         
-# Load CSS
-def load_css(file_name):
-    with open(file_name) as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-
-# Load HTML content based on the selected menu item
+# Load HTML content based on the selected menu item (cached and minified)
 def load_html(file_name):
-    html_file = os.path.join(base_dir, file_name)
-    with open(html_file) as f:
-        html_content = f.read()
-    return html_content
+    return get_html(file_name)
 
 # Function to handle logout
 def handle_logout():
@@ -318,8 +322,14 @@ def show_blog_article():
     edu_blog.show_edu_blog_page()
     
 def main():
-    css_path = os.path.join(os.path.dirname(__file__), 'style.css')
-    load_css(css_path)  # Load CSS
+    # Readiness probe for load balancers: ?health=firebase reports this node's Firebase state
+    if st.query_params.get("health") == "firebase":
+        st.json(get_firebase_health())
+        st.write("ready" if is_firebase_ready() else "starting")
+        st.stop()
+
+    begin_run()
+    inject_css()  # Load CSS (pages asking for it again in this run are skipped)
 
     # Check for authentication status
     if "authenticated" not in st.session_state:
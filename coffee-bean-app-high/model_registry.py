@@ -0,0 +1,131 @@
+import hashlib
+import os
+import resource
+import threading
+import time
+
+import numpy as np
+from ultralytics import YOLO
+
+from inference_backend import INFERENCE_BACKEND, configure_onnx_session, resolve_model_artifact
+
+# Process-wide registry of loaded YOLO models.
+# Streamlit re-executes page scripts on every rerun and creates a new
+# VideoTransformer per WebRTC stream, so models are kept here (one per weight
+# file and inference backend) and shared by every session and transformer in
+# the process.
+_models = {}
+_model_stats = {}
+_lock = threading.Lock()
+_prewarm_threads = {}
+_prewarm_lock = threading.Lock()  # Separate from _lock, which is held for the whole load
+
+# Size of the dummy frame used to warm up a freshly loaded model
+WARMUP_IMAGE_SIZE = 640
+
+
+# Function to read the resident memory of this process in bytes
+def get_resident_memory():
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Not on Linux: fall back to the peak RSS (kilobytes on Linux, bytes on macOS)
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if os.uname().sysname == "Darwin" else max_rss * 1024
+
+
+# Function to fingerprint a weight file so cached predictions can be tied to it
+def get_model_version(model_path):
+    model_path = os.path.abspath(model_path)
+    for stats in _model_stats.values():
+        if stats["path"] == model_path:
+            return stats["version"]
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+# Function to run one dummy inference so the first real request does not pay
+# for lazy initialisation (predictor setup, kernel selection, memory pools)
+def warmup_model(model, image_size=WARMUP_IMAGE_SIZE):
+    dummy = np.zeros((image_size, image_size, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    model.predict(source=dummy, save=False, verbose=False)
+    return time.perf_counter() - start
+
+
+# Function to load a model once per process and return the shared instance
+def get_model(model_path, warmup=True, backend=INFERENCE_BACKEND):
+    model_path = os.path.abspath(model_path)
+    key = (model_path, backend)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        # Another thread may have finished loading while we waited for the lock
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        # Exported artifacts are produced on first use and cached next to the weights
+        artifact_path = resolve_model_artifact(model_path, backend)
+
+        rss_before = get_resident_memory()
+        start = time.perf_counter()
+        model = YOLO(artifact_path, task="detect")
+        load_seconds = time.perf_counter() - start
+
+        warmup_seconds = None
+        if warmup:
+            warmup_seconds = warmup_model(model)
+            if backend.startswith("onnx") and configure_onnx_session(model, artifact_path):
+                warmup_model(model)  # Warm the re-created session too
+        rss_after = get_resident_memory()
+
+        _model_stats[key] = {
+            "path": model_path,
+            "backend": backend,
+            "artifact": artifact_path,
+            "version": get_model_version(model_path),
+            "load_seconds": load_seconds,
+            "warmup_seconds": warmup_seconds,
+            "resident_memory_bytes": max(rss_after - rss_before, 0),
+            "process_resident_memory_bytes": rss_after,
+        }
+        _models[key] = model
+
+        resident_mib = _model_stats[key]["resident_memory_bytes"] / 2**20
+        print(f"Loaded model {artifact_path} ({backend}) in {load_seconds:.2f}s (+{resident_mib:.1f} MiB RSS)")
+        return model
+
+
+# Function to load and warm a model on a background thread, so the first page
+# that needs it finds it in the registry (get_model waits if it is still loading)
+def start_model_prewarm(model_path, backend=INFERENCE_BACKEND):
+    key = (os.path.abspath(model_path), backend)
+    with _prewarm_lock:
+        if key in _models or key in _prewarm_threads:
+            return
+        thread = threading.Thread(target=prewarm_model, args=key, name="model-prewarm", daemon=True)
+        _prewarm_threads[key] = thread
+    thread.start()
+
+
+def prewarm_model(model_path, backend=INFERENCE_BACKEND):
+    try:
+        get_model(model_path, backend=backend)
+    except Exception as e:
+        print(f"Error preloading model {model_path}: {e}")
+        with _prewarm_lock:
+            _prewarm_threads.pop((model_path, backend), None)  # Let a later call retry
+
+
+# Function to report load time and memory of every loaded model
+def get_model_stats():
+    with _lock:
+        return [dict(stats) for stats in _model_stats.values()]
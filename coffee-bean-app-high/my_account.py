@@ -1,24 +1,21 @@
 import streamlit as st
-from firebase_config import initialize_firebase, db, update_user_password, delete_user_account
+from firebase_config import update_user_password, delete_user_account
+from profile_cache import get_user_profile
 
 def show_my_account_page():
     st.title("Account Page")
     
-    initialize_firebase()  # Ensure Firebase is initialized
-    
     if 'user' not in st.session_state:
         st.error("User not authenticated")
         return
     
     user_id = st.session_state['user']
     
-    # Retrieve user details from Firestore
-    user_ref = db.collection("users").document(user_id)
-    user_details = user_ref.get()
+    # Retrieve user details (cached per session and process)
+    user_data = get_user_profile(user_id)
     
     # READ ACCOUNT DETAILS
-    if user_details.exists:
-        user_data = user_details.to_dict()
+    if user_data is not None:
         st.write("Account Details")
         st.write(f"Email: {user_data.get('email', 'N/A')}")
         st.write(f"User ID: {user_data.get('uid', 'N/A')}")
@@ -1,36 +1,30 @@
 import os
 import streamlit as st
-from ultralytics import YOLO
-from PIL import Image
 import cv2
-import numpy as np
 from streamlit_webrtc import webrtc_streamer, VideoTransformerBase, WebRtcMode, RTCConfiguration
 
-from fpdf import FPDF
-from datetime import datetime
-from io import BytesIO
-import tempfile
+import threading
+import time
+
+from model_registry import get_model, get_model_version
+from inference_backend import INFERENCE_BACKEND
+from inference_server import get_inference_server
+from prediction_cache import PredictionCache, make_cache_key
+from tracker import IoUTracker
+from tray_analysis import analyze_tray
+from report_service import ReportService, ReportQueueFull, DONE, FAILED
+from report_pdf import build_prediction_report
+from bean_detection import CONFIDENCE_THRESHOLD, find_best_detection, model_path
+from preprocessing import load_image, preprocess_image, PREPROCESSING_VERSION
+from assets import get_icon_bytes, inject_css
 
 # Set the working directory to the script's directory
 base_dir = os.path.dirname(os.path.abspath(__file__))
-model_path = os.path.join(base_dir, 'best-nano.pt')
-css_path = os.path.join(base_dir, 'style.css')
-html_path = os.path.join(base_dir, 'predict.html')
 
 pdf_icon_path = os.path.join(base_dir, 'pdf-icon-fix.png')
 
-# Load CSS
-def load_css(file_name):
-    with open(file_name) as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-
-# Load HTML
-def load_html(file_name):
-    with open(file_name) as f:
-        st.markdown(f.read(), unsafe_allow_html=True)
-
-load_css(css_path)
-load_html(html_path)
+# How often the page checks on a report being prepared in the background
+REPORT_POLL_SECONDS = 1.0
 
 # Debugging: Check if the file exists
 if os.path.exists(model_path):
@@ -38,226 +32,303 @@ if os.path.exists(model_path):
 else:
     st.write(f"File not found at {model_path}")
 
-# Load the YOLOv8 model
-model = YOLO(model_path)
-
-# Confidence threshold for considering the detected object as a coffee bean
-CONFIDENCE_THRESHOLD = 0.5
-
-def load_image(image_file):
-    img = Image.open(image_file)
-    img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)  # Convert PIL image to OpenCV format
-
-    # Calculate target size and padding color
-    target_width = 300
-    target_height = 300
-    pad_color = (128, 128, 128)  # Gray color padding
+# Get the YOLOv8 model (shared by every session and camera stream in this process).
+# main.py starts loading and warming it at startup; this waits if that is not finished yet
+model = get_model(model_path)
 
-    # Resize and pad the image
-    img = resize_with_padding(img, target_width, target_height, pad_color, scale_factor=0.25)
-
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)  # Convert back to RGB format
-    return img
-
-def resize_with_padding(img, target_width, target_height, pad_color=(255, 255, 255), scale_factor=1.0):
-    # Get the image dimensions
-    height, width = img.shape[:2]
-
-    # Calculate the aspect ratio
-    aspect_ratio = width / height
-
-    # Calculate the new dimensions while maintaining the aspect ratio
-    if aspect_ratio > 1:
-        new_width = int(target_width * scale_factor)
-        new_height = int(new_width / aspect_ratio)
-    else:
-        new_height = int(target_height * scale_factor)
-        new_width = int(new_height * aspect_ratio)
+# Batch concurrent detection requests from all sessions into one forward pass
+inference_server = get_inference_server(model)
 
-    # Resize the image
-    resized_img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
+# Tray mode analyses a whole photo of beans, so the tray fills the whole model input
+TRAY_IMAGE_SIZE = 640
+TRAY_NMS_IOU_THRESHOLD = 0.5
 
-    # Create a new image with the target dimensions and the specified padding color
-    padded_img = np.full((target_height, target_width, 3), pad_color, dtype=np.uint8)
+# Live camera: run detection off the display path, at most CAMERA_DETECT_FPS times per second
+CAMERA_ASYNC_MODE = os.getenv("CAMERA_ASYNC_MODE", "true").lower() == "true"
+CAMERA_DETECT_FPS = float(os.getenv("CAMERA_DETECT_FPS", "5"))
 
-    # Calculate the offsets for centering the resized image
-    y_offset = (target_height - new_height) // 2
-    x_offset = (target_width - new_width) // 2
+# Live camera: carry boxes between detections with a tracker, re-detecting every N frames
+CAMERA_TRACKING = os.getenv("CAMERA_TRACKING", "false").lower() == "true"
+CAMERA_DETECT_EVERY_N = int(os.getenv("CAMERA_DETECT_EVERY_N", "5"))
 
-    # Copy the resized image to the center of the padded image
-    padded_img[y_offset:y_offset + new_height, x_offset:x_offset + new_width] = resized_img
+# Cache of prediction summaries for images we have already seen
+model_version = f"{get_model_version(model_path)}-{INFERENCE_BACKEND}-p{PREPROCESSING_VERSION}"
+prediction_cache = PredictionCache()
 
-    return padded_img
+# Background PDF rendering shared by every session
+report_service = ReportService()
 
 def detect_objects(_img):
-    results = model.predict(source=_img, save=False)
+    results = inference_server.predict(_img)
     return results
 
-class VideoTransformer(VideoTransformerBase):
-    def __init__(self):
-        self.model = YOLO(model_path)  # Initialize YOLO model here
-
-    def transform(self, frame):
-        img = frame.to_ndarray(format="bgr24")
+# Function to get the best box, class and confidence for an uploaded image,
+# answering from the prediction cache when the same image (cache_key) was seen before
+def predict_uploaded_image(cache_key, image):
+    prediction = prediction_cache.get(cache_key)
+    if prediction is not None:
+        return prediction
+
+    with st.spinner("Detecting objects..."):
+        results = detect_objects(image)
+
+    best_result, max_confidence = find_best_detection(results)
+    prediction = {"box": None, "class_id": None, "class_name": None, "confidence": float(max_confidence)}
+    if best_result and max_confidence >= CONFIDENCE_THRESHOLD:
+        class_id = int(best_result[5])
+        prediction.update({
+            "box": [float(v) for v in best_result[:4]],
+            "class_id": class_id,
+            "class_name": model.names[class_id],
+        })
+
+    prediction_cache.put(cache_key, prediction)
+    return prediction
 
+class VideoTransformer(VideoTransformerBase):
+    def __init__(self, async_mode=CAMERA_ASYNC_MODE, detect_fps=CAMERA_DETECT_FPS,
+                 tracking=CAMERA_TRACKING, detect_every_n=CAMERA_DETECT_EVERY_N):
+        self.model = get_model(model_path)  # Reuse the process-wide YOLO model
+
+        # In async mode inference runs on a worker thread against the newest
+        # frame only, while every outgoing frame gets the last known boxes drawn
+        self.async_mode = async_mode
+        self.detect_interval = 1.0 / detect_fps if detect_fps > 0 else 0.0
+
+        # With tracking on, boxes are carried between frames by the tracker and
+        # YOLO only runs every detect_every_n frames or when tracks fade out
+        self.tracker = IoUTracker() if tracking else None
+        self.detect_every_n = max(1, int(detect_every_n))
+        self._frames_since_detection = self.detect_every_n
+        self._tracker_lock = threading.Lock()
+
+        self._overlay = []  # Last known (box, label) pairs
+        self._overlay_lock = threading.Lock()
+        self._latest_frame = None
+        self._frame_ready = threading.Condition()
+        self._worker = None
+        self._stopped = False
+
+    # Function to run detection on one frame and return (box, class_name, confidence) tuples
+    def detect(self, img):
         results = detect_objects(img)
-        best_result = None
-        max_confidence = 0
-
-        if results[0].boxes.data.tolist():  # Check if any objects were detected
-            for result in results[0].boxes.data.tolist():
-                confidence = result[4]  # Confidence score
-                if confidence > max_confidence:
-                    max_confidence = confidence
-                    best_result = result
+        best_result, max_confidence = find_best_detection(results)
 
         if best_result and max_confidence > 0.6:  # Adjust threshold as needed
             class_id = int(best_result[5])
             class_name = self.model.names[class_id]
-            x1, y1, x2, y2 = map(int, best_result[:4])
+            box = tuple(map(int, best_result[:4]))
+            return [(box, class_name, max_confidence)]
+        return []
 
+    def draw_overlay(self, img, overlay):
+        for (x1, y1, x2, y2), label in overlay:
             # Draw bounding box and label on the image
             cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)  # Draw bounding box
-            label = f"{class_name} {max_confidence:.2f}"  # Label with class name and confidence score
             cv2.putText(img, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (36, 255, 12), 2)  # Draw label
 
+    def transform(self, frame):
+        img = frame.to_ndarray(format="bgr24")
+
+        if self.tracker is None:
+            if self.async_mode:
+                self._submit_frame(img)
+                with self._overlay_lock:
+                    overlay = self._overlay
+            else:
+                overlay = self._make_overlay(self.detect(img))
+        else:
+            with self._tracker_lock:
+                tracks = self.tracker.predict()
+                self._frames_since_detection += 1
+                needs_detection = (self._frames_since_detection >= self.detect_every_n
+                                   or not tracks
+                                   or self.tracker.weakest_confidence() < CONFIDENCE_THRESHOLD)
+                if needs_detection:
+                    self._frames_since_detection = 0
+            if needs_detection:
+                if self.async_mode:
+                    self._submit_frame(img)
+                else:
+                    self._update_tracks(self.detect(img))
+            with self._tracker_lock:
+                overlay = self._track_overlay()
+
+        self.draw_overlay(img, overlay)
         return img
 
-def create_pdf(test_input_path, test_output_path, predicted_class, confidence):
-    class PDF(FPDF):
-        def header(self):
-            # Brown bar at the top
-            self.set_fill_color(139, 69, 19)  # Dark brown color
-            self.rect(0, 0, 210, 15, 'F')
-
-        def footer(self):
-            # Brown bar at the bottom
-            self.set_fill_color(139, 69, 19)  # Dark brown color
-            self.rect(0, 282, 210, 15, 'F')
-            self.set_y(-40)  # Move to the bottom of the page
-            self.set_font("Arial", 'I', size=8)
-            self.multi_cell(0, 10, "Disclaimer: This prediction is based on machine learning models and may not be 100% accurate.", align='C')
-        
-    pdf = PDF()
-    pdf.add_page()
-
-    # Title
-    pdf.set_font("Arial", 'B', size=24)
-    pdf.set_text_color(139, 69, 19)  # Dark brown color
-    pdf.cell(200, 30, txt="BEANXPERT", ln=True, align='C')
-
-    # Test time
-    pdf.set_font("Arial", size=12)
-    pdf.set_text_color(0, 0, 0)  # Black color
-    test_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    pdf.cell(200, 10, txt=f"TEST TIME: {test_time}", ln=True, align='C')
-
-    # Test input and output photos
-    pdf.set_font("Arial", 'B', size=14)
-    image_width = 45  # 90 * 0.8 = 72
-    pdf.cell(95, 10, txt="TEST INPUT PHOTO:", ln=0, align='L')
-    pdf.cell(95, 10, txt="TEST OUTPUT PHOTO:", ln=1, align='R')
-    pdf.image(test_input_path, x=10, y=70, w=image_width)
-    pdf.image(test_output_path, x=150, y=70, w=image_width)
-
-    # Test result
-    pdf.ln(100)  # Move cursor down to avoid overlapping
-    pdf.set_font("Arial", size=12)
-    pdf.multi_cell(0, 10, f"TEST RESULT: This is a {predicted_class} coffee bean with confidence {confidence:.2f}", align='C')
-
-    # Signature
-    pdf.ln(10)
-    pdf.cell(140)  # Move to the right
-    pdf.set_font("Arial", size=10)
-    pdf.cell(0, 10, "Signed by BeanXpert", ln=True, align='R')
-
-    signature_path = os.path.join(base_dir, 'signature-bean.png')
-    pdf.image(signature_path, x=150, y=pdf.get_y(), w=50)  # Adjust width as needed
-
-    pdf.ln(30)
-    pdf.cell(0, 10, "Jaya Iskandar", ln=True, align='R')
-    pdf.cell(0, 10, "Founder of BeanXpert", ln=True, align='R')
-
-    # Save the PDF to a file
-    pdf_file = os.path.join(base_dir, 'prediction_result.pdf')
-    pdf.output(pdf_file)
-
-    return pdf_file
+    def on_ended(self):
+        with self._frame_ready:
+            self._stopped = True
+            self._frame_ready.notify()
+
+    def _make_overlay(self, detections):
+        # Label with class name and confidence score
+        return [(box, f"{class_name} {confidence:.2f}") for box, class_name, confidence in detections]
+
+    def _track_overlay(self):
+        return [(track.int_box(), f"{track.class_name} {track.confidence:.2f}") for track in self.tracker.tracks]
+
+    def _update_tracks(self, detections):
+        with self._tracker_lock:
+            self.tracker.update(detections)
+
+    def _submit_frame(self, img):
+        with self._frame_ready:
+            # Overwrite any frame the worker has not picked up yet (latest frame wins)
+            self._latest_frame = img.copy()
+            self._frame_ready.notify()
+
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run_detection, name="camera-detection", daemon=True)
+            self._worker.start()
+
+    def _run_detection(self):
+        while True:
+            with self._frame_ready:
+                while self._latest_frame is None and not self._stopped:
+                    self._frame_ready.wait()
+                if self._stopped:
+                    return
+                img, self._latest_frame = self._latest_frame, None
+
+            started = time.monotonic()
+            try:
+                detections = self.detect(img)
+            except Exception as e:
+                print(f"Error running camera detection: {e}")
+                detections = []
+
+            if self.tracker is not None:
+                self._update_tracks(detections)
+            else:
+                overlay = self._make_overlay(detections)
+                with self._overlay_lock:
+                    self._overlay = overlay
+
+            # Cap the detection rate; frames arriving meanwhile replace each other
+            remaining = self.detect_interval - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+# Fragment that polls a report job without rerunning the whole page,
+# then triggers one full rerun to show the download button
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def show_report_progress(prediction_key):
+    report_job = report_service.get(prediction_key)
+    if report_job is not None and report_job.pending:
+        st.info("Preparing report...")
+    else:
+        st.rerun()
+
+# Function to detect, count and describe every bean in a tray photo
+def show_tray_analysis(uploaded_file):
+    image = load_image(uploaded_file, target_size=TRAY_IMAGE_SIZE, scale_factor=1.0)
+
+    with st.spinner("Detecting beans..."):
+        results = detect_objects(image)
+
+    analysis = analyze_tray(results[0], model.names, CONFIDENCE_THRESHOLD, TRAY_NMS_IOU_THRESHOLD)
+    if analysis["total"] == 0:
+        st.warning("No coffee beans found in this image.")
+        return
+
+    # Draw every kept box with its class name and confidence
+    for x1, y1, x2, y2, confidence, class_id in analysis["detections"]:
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        label = f"{model.names[int(class_id)]} {confidence:.2f}"
+        cv2.putText(image, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (36, 255, 12), 2)
+
+    st.success("Done!")
+    st.image(image, caption=f"{analysis['total']} beans detected", width=600)
+
+    st.subheader("Beans per class")
+    st.table({"Class": list(analysis["class_counts"].keys()), "Count": list(analysis["class_counts"].values())})
+
+    st.subheader("Confidence distribution")
+    histogram = analysis["confidence_histogram"]
+    edges = histogram["bin_edges"]
+    st.bar_chart({
+        "Confidence": [f"{edges[i]:.2f}-{edges[i + 1]:.2f}" for i in range(len(edges) - 1)],
+        "Beans": histogram["counts"],
+    }, x="Confidence", y="Beans")
+
+    st.subheader("Box statistics (pixels)")
+    st.table(analysis["box_stats"])
 
 def show_predict_page():
+    inject_css()  # Load CSS (once per run)
     st.markdown("<div class='upload-section'>Upload an image</div>", unsafe_allow_html=True)
 
     uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
+    tray_mode = st.toggle("Tray mode: analyze every bean in the photo")
 
-    if uploaded_file is not None:
-        image = load_image(uploaded_file)
+    if uploaded_file is not None and tray_mode:
+        show_tray_analysis(uploaded_file)
+    elif uploaded_file is not None:
+        image, preprocess_timings = preprocess_image(uploaded_file)
         st.image(image, caption='Uploaded Image', width=300)  # Set width to 300 pixels
 
-        with st.spinner("Detecting objects..."):
-            results = detect_objects(image)
+        with st.expander("Processing details"):
+            source_width, source_height = preprocess_timings["source_size"]
+            st.write(f"Decoded at {source_width}x{source_height} in {preprocess_timings['decode'] * 1000:.1f} ms, "
+                     f"letterboxed in {preprocess_timings['letterbox'] * 1000:.1f} ms")
 
-        is_coffee_bean = False
-        max_confidence = 0.0
-        predicted_class = None
-        best_result = None
+        prediction_key = make_cache_key(uploaded_file.getvalue(), model_version, CONFIDENCE_THRESHOLD)
+        prediction = predict_uploaded_image(prediction_key, image)
 
-        if results[0].boxes.data.tolist():  # Check if any objects were detected
-            for result in results[0].boxes.data.tolist():
-                confidence = result[4]  # Confidence score
-                if confidence > max_confidence:
-                    max_confidence = confidence
-                    best_result = result
-
-        if best_result and max_confidence >= CONFIDENCE_THRESHOLD:
-            is_coffee_bean = True
-            class_id = int(best_result[5])
-            predicted_class = model.names[class_id]
+        is_coffee_bean = prediction["box"] is not None
+        max_confidence = prediction["confidence"]
+        predicted_class = prediction["class_name"]
 
         if is_coffee_bean:
             st.success("Done!")
             st.write(f"This is a {predicted_class} coffee bean.")
 
             # Draw bounding box and label on the image
-            x1, y1, x2, y2 = map(int, best_result[:4])
+            x1, y1, x2, y2 = map(int, prediction["box"])
             cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)  # Draw bounding box
             label = f"{predicted_class} {max_confidence:.2f}"  # Label with class name and confidence score
             cv2.putText(image, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (36, 255, 12), 2)  # Draw label
 
             st.image(image, caption='Detected Object', width=300)  # Display the image with bounding box and label
 
-            # Save the images to temporary files
-            input_image = Image.open(uploaded_file)
-            if input_image.mode == 'RGBA':
-                input_image = input_image.convert('RGB')
-            input_image_tempfile = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            input_image.save(input_image_tempfile.name)
-
-            output_image_tempfile = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            output_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))  # Convert image back to PIL format
-            output_image.save(output_image_tempfile.name)
-            
-            # Create and download the PDF
-            pdf_file = create_pdf(input_image_tempfile.name, output_image_tempfile.name, predicted_class, max_confidence)
             # Create two columns
             col1, col2 = st.columns([1, 15])  # Adjust the ratio as needed
 
             with col1:
                 # Display the PDF icon
                 if os.path.exists(pdf_icon_path):
-                    pdf_icon = Image.open(pdf_icon_path)
-                    st.image(pdf_icon, width=70)
+                    st.image(get_icon_bytes(os.path.basename(pdf_icon_path)), width=70)
                 else:
                     st.write("PDF icon not found")
 
             with col2:
                 #Add some vertical space
                 st.markdown('<div style="margin-top: 20px;"></div>', unsafe_allow_html=True)
-                
-                # Download button
-                with open(pdf_file, "rb") as f:
+
+                # The report is only rendered when asked for, on a background worker
+                report_job = report_service.get(prediction_key)
+                if report_job is None or report_job.status == FAILED:
+                    if report_job is not None:
+                        st.error("Failed to prepare the report. Please try again.")
+                    if st.button("Prepare Official Prediction Results"):
+                        try:
+                            report_job = report_service.submit(
+                                prediction_key, build_prediction_report,
+                                uploaded_file.getvalue(), image, predicted_class, max_confidence,
+                            )
+                        except ReportQueueFull as e:
+                            st.warning(str(e))
+
+                if report_job is not None and report_job.pending:
+                    show_report_progress(prediction_key)
+                elif report_job is not None and report_job.status == DONE:
+                    # Download button
                     st.download_button(
                         label="Download Official Prediction Results",
-                        data=f,
+                        data=report_job.result,
                         file_name="prediction_result.pdf",
                         mime="application/pdf"
                     )
@@ -273,12 +344,10 @@ def show_predict_page():
         {"iceServers": [{"urls": ["stun:" + STUN_SERVER]}]}
     )
     
-    video_transformer = VideoTransformer()  # Create VideoTransformer instance
-
     webrtc_ctx = webrtc_streamer(
         key="example",
         mode=WebRtcMode.SENDRECV,
-        video_transformer_factory=lambda: video_transformer,
+        video_transformer_factory=VideoTransformer,  # One transformer (and worker thread) per stream
         media_stream_constraints={"video": True, "audio": False},
         rtc_configuration=RTC_CONFIGURATION,
     )
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Content-addressed cache of prediction summaries.
+# Keys are a hash of the raw image bytes plus the model version and the
+# confidence threshold, so a re-uploaded photo (or a Streamlit rerun on the same
+# upload) is answered without running the model again. Entries live in an
+# in-memory LRU and, optionally, in a directory of small JSON files whose total
+# size is capped.
+
+DEFAULT_MEMORY_ENTRIES = int(os.getenv("PREDICTION_CACHE_ENTRIES", "1024"))
+DEFAULT_DISK_DIR = os.getenv("PREDICTION_CACHE_DIR")  # Disk tier is off unless set
+DEFAULT_DISK_MAX_BYTES = int(os.getenv("PREDICTION_CACHE_MAX_BYTES", str(64 * 2**20)))
+
+
+# Function to build the cache key for an image
+def make_cache_key(image_bytes, model_version, confidence_threshold):
+    digest = hashlib.sha256()
+    digest.update(image_bytes)
+    digest.update(f"|{model_version}|{confidence_threshold:.4f}".encode())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, max_entries=DEFAULT_MEMORY_ENTRIES, disk_dir=DEFAULT_DISK_DIR, disk_max_bytes=DEFAULT_DISK_MAX_BYTES):
+        self.max_entries = max(1, int(max_entries))
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk_bytes = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_files())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._entries),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_files(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((entry.path, stat.st_mtime, stat.st_size))
+        return files
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # Refresh mtime so eviction stays least-recently-used
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        data = json.dumps(entry).encode("utf-8")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            existed = os.path.exists(path)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing prediction cache entry: {e}")
+            return
+
+        with self._lock:
+            if not existed:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Drop the least recently used files until we are back under 90% of the cap
+        files = sorted(self._disk_files(), key=lambda f: f[1])
+        total = sum(size for _, _, size in files)
+        target = self.disk_max_bytes * 0.9
+        for path, _, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+# Cache of users/{uid} profile documents.
+# Two tiers: a copy in the visitor's session state, so reruns of the same
+# session (every keystroke on the account page) never leave the process, and a
+# bounded process-wide LRU with a TTL shared by all sessions. Each uid has a
+# generation number that invalidate_user_profile() bumps, which makes session
+# copies held by other sessions stale without having to find them.
+
+PROFILE_CACHE_ENTRIES = int(os.getenv("PROFILE_CACHE_ENTRIES", "1024"))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+
+_SESSION_KEY = "_user_profile"
+_MISSING = object()
+
+_profiles = OrderedDict()  # uid -> (expires_at, generation, profile or None)
+_generations = {}
+_lock = threading.Lock()
+
+
+def _read_profile(uid):
+    from firebase_config import get_db
+
+    snapshot = get_db().collection("users").document(uid).get()
+    return snapshot.to_dict() if snapshot.exists else None
+
+
+def _session_lookup(uid, generation):
+    try:
+        cached = st.session_state.get(_SESSION_KEY)
+    except Exception:
+        return _MISSING  # Not running inside a Streamlit session
+    if cached and cached["uid"] == uid and cached["generation"] == generation:
+        return cached["profile"]
+    return _MISSING
+
+
+def _session_store(uid, generation, profile):
+    try:
+        st.session_state[_SESSION_KEY] = {"uid": uid, "generation": generation, "profile": profile}
+    except Exception:
+        pass
+
+
+# Function to get a user's profile document as a dict (None if it does not exist)
+def get_user_profile(uid):
+    with _lock:
+        generation = _generations.get(uid, 0)
+
+    profile = _session_lookup(uid, generation)
+    if profile is not _MISSING:
+        return profile
+
+    with _lock:
+        entry = _profiles.get(uid)
+        if entry is not None and entry[0] > time.monotonic() and entry[1] == generation:
+            _profiles.move_to_end(uid)
+            profile = entry[2]
+
+    if profile is _MISSING:
+        profile = _read_profile(uid)
+        with _lock:
+            if _generations.get(uid, 0) == generation:
+                _profiles[uid] = (time.monotonic() + PROFILE_CACHE_TTL_SECONDS, generation, profile)
+                _profiles.move_to_end(uid)
+                while len(_profiles) > PROFILE_CACHE_ENTRIES:
+                    _profiles.popitem(last=False)
+
+    _session_store(uid, generation, profile)
+    return profile
+
+
+# Function to drop a cached profile after it was changed or deleted
+def invalidate_user_profile(uid):
+    with _lock:
+        _generations[uid] = _generations.get(uid, 0) + 1
+        _profiles.pop(uid, None)
+    try:
+        cached = st.session_state.get(_SESSION_KEY)
+        if cached and cached["uid"] == uid:
+            del st.session_state[_SESSION_KEY]
+    except Exception:
+        pass
+
+
+# Function to check whether writing these fields would change the stored profile
+def profile_needs_update(profile, fields):
+    if profile is None:
+        return True
+    return any(profile.get(key, _MISSING) != value for key, value in fields.items())
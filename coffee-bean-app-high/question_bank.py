@@ -0,0 +1,232 @@
+import html
+import os
+import random
+import threading
+from functools import lru_cache
+
+from assets import get_json
+
+# Compiled quiz question bank.
+# questions.json is validated once per process and turned into immutable
+# Question objects whose HTML is rendered up front, indexed by level and tag.
+# A game does not copy or shuffle the questions: for each level it keeps one
+# random 64-bit seed, and the questions it asks are random.Random(seed).sample()
+# of that level's indices. Every ordered selection is equally likely, sampling
+# is without replacement, and a session stores O(1) state however large the
+# bank grows. The sample for a seed is computed once and cached, in O(k) for
+# k questions per level.
+#
+# In adaptive mode the seeded sample is a candidate pool (ADAPTIVE_POOL_FACTOR
+# times the questions asked per level) rather than a fixed order: each next
+# question is the unasked candidate whose difficulty is closest to a target
+# that rises with the player's correct streak and drops after a miss. A
+# question's difficulty starts at its optional "difficulty" field (0-1, or a
+# default for its level) and moves towards the share of players in this
+# process who got it wrong.
+
+LEVELS = ("easy", "medium", "hard")
+
+# Questions asked per level in one game (levels with fewer questions ask them all)
+QUESTIONS_PER_LEVEL = int(os.getenv("QUIZ_QUESTIONS_PER_LEVEL", "5"))
+
+# Adaptive mode picks questions by difficulty and moves a player up a level
+# early after ADAPTIVE_PROMOTE_STREAK correct answers in a row
+QUIZ_ADAPTIVE = os.getenv("QUIZ_ADAPTIVE", "false").lower() == "true"
+ADAPTIVE_PROMOTE_STREAK = int(os.getenv("QUIZ_ADAPTIVE_PROMOTE_STREAK", "3"))
+ADAPTIVE_POOL_FACTOR = int(os.getenv("QUIZ_ADAPTIVE_POOL_FACTOR", "3"))
+
+# Target difficulty moves this far per correct answer in a row (and back after a miss)
+ADAPTIVE_STEP = 0.15
+
+# Difficulty before any answers, for questions without a "difficulty" field
+LEVEL_DIFFICULTY = {"easy": 0.3, "medium": 0.5, "hard": 0.7}
+
+# How many answers a question's prior difficulty counts for
+DIFFICULTY_PRIOR_WEIGHT = 10
+
+MAX_LIVES = 5
+
+_REQUIRED_FIELDS = ("question", "options", "answer", "explanation")
+
+
+# Function to pick the question positions a game asks in one level, in order
+@lru_cache(maxsize=4096)
+def sample_positions(n, k, seed):
+    return tuple(random.Random(seed).sample(range(n), k))
+
+
+# Function to get the difficulty the next adaptive question should have
+def target_difficulty(streak, last_correct):
+    if last_correct is False:
+        target = 0.5 - ADAPTIVE_STEP
+    else:
+        target = 0.5 + ADAPTIVE_STEP * streak
+    return min(0.95, max(0.05, target))
+
+
+class InvalidQuestion(ValueError):
+    pass
+
+
+class Question:
+    __slots__ = ("id", "level", "tags", "question", "options", "answer", "explanation", "difficulty", "html")
+
+    def __init__(self, id, level, tags, question, options, answer, explanation, difficulty):
+        self.id = id
+        self.level = level
+        self.tags = tags
+        self.difficulty = difficulty
+        self.question = question
+        self.options = options
+        self.answer = answer
+        self.explanation = explanation
+        self.html = (
+            '<div class="question-container">'
+            f'<p class="question-text">{html.escape(question)}</p>'
+            '</div>'
+        )
+
+
+# Function to check one raw question and build its compiled form
+def compile_question(id, level, raw):
+    missing = [field for field in _REQUIRED_FIELDS if not raw.get(field)]
+    if missing:
+        raise InvalidQuestion(f"{level} question {id} is missing {', '.join(missing)}")
+    options = tuple(str(option) for option in raw["options"])
+    if len(options) < 2 or len(set(options)) != len(options):
+        raise InvalidQuestion(f"{level} question {id} needs at least two distinct options")
+    if raw["answer"] not in options:
+        raise InvalidQuestion(f"{level} question {id} has an answer that is not one of its options")
+    tags = tuple(sorted({level, *raw.get("tags", ())}))
+    try:
+        difficulty = float(raw.get("difficulty", LEVEL_DIFFICULTY.get(level, 0.5)))
+    except (TypeError, ValueError):
+        difficulty = -1.0
+    if not 0.0 <= difficulty <= 1.0:
+        raise InvalidQuestion(f"{level} question {id} needs a difficulty between 0 and 1")
+    return Question(id, level, tags, str(raw["question"]), options, str(raw["answer"]), str(raw["explanation"]), difficulty)
+
+
+class QuestionBank:
+    def __init__(self, raw_levels, questions_per_level=QUESTIONS_PER_LEVEL):
+        questions = []
+        by_level = {}
+        by_tag = {}
+        for level in LEVELS:
+            ids = []
+            for raw in raw_levels.get(level, ()):
+                try:
+                    question = compile_question(len(questions), level, raw)
+                except InvalidQuestion as e:
+                    print(f"Skipping invalid quiz question: {e}")
+                    continue
+                questions.append(question)
+                ids.append(question.id)
+                for tag in question.tags:
+                    by_tag.setdefault(tag, []).append(question.id)
+            if not ids:
+                raise InvalidQuestion(f"The question bank has no valid {level} questions")
+            by_level[level] = tuple(ids)
+
+        self.questions = tuple(questions)
+        self.by_level = by_level
+        self.by_tag = {tag: tuple(ids) for tag, ids in by_tag.items()}
+        self.per_level = {level: min(max(1, questions_per_level), len(ids)) for level, ids in by_level.items()}
+
+        # Answers seen per question in this process, for adaptive selection
+        self._attempts = [0] * len(questions)
+        self._misses = [0] * len(questions)
+        self._stats_lock = threading.Lock()
+
+        # Level headers and hearts only depend on a handful of values, so render them all now
+        self._headers = {
+            (level, index): (
+                f"<p style='font-size: 1.2rem; font-weight: bold;'>Current Level: &nbsp;{level.upper()}</p>"
+                f"<p style='font-size: 1.2rem; font-weight: bold;'>Question: &nbsp;{index + 1}/{count}</p>"
+            )
+            for level, count in self.per_level.items()
+            for index in range(count)
+        }
+        self._hearts = tuple(
+            f"<p class='hearts'>{'❤️' * lives} {'🤍' * (MAX_LIVES - lives)}</p>"
+            for lives in range(MAX_LIVES + 1)
+        )
+
+    # Function to pick a random question order for each level: {level: seed}
+    def new_order(self, rng=None):
+        rng = rng or random.SystemRandom()
+        return {level: rng.getrandbits(64) for level in self.by_level}
+
+    # Function to get the index-th question of a level in a game's order
+    def question(self, level, seed, index):
+        ids = self.by_level[level]
+        positions = sample_positions(len(ids), self.per_level[level], seed)
+        return self.questions[ids[positions[index]]]
+
+    # Function to get the adaptive game's next question in a level: the unasked
+    # candidate from the game's seeded pool whose difficulty is closest to target
+    def next_question(self, level, seed, asked, target):
+        ids = self.by_level[level]
+        pool_size = min(len(ids), self.per_level[level] * max(1, ADAPTIVE_POOL_FACTOR))
+        best = None
+        for position in sample_positions(len(ids), pool_size, seed):
+            question_id = ids[position]
+            if question_id in asked:
+                continue
+            gap = abs(self.difficulty(question_id) - target)
+            if best is None or gap < best[0]:
+                best = (gap, question_id)
+        if best is None:
+            raise InvalidQuestion(f"No {level} questions left to ask")
+        return self.questions[best[1]]
+
+    # Function to count one answer towards a question's measured difficulty
+    def record_result(self, question_id, correct):
+        with self._stats_lock:
+            self._attempts[question_id] += 1
+            self._misses[question_id] += 0 if correct else 1
+
+    # Share of answers to a question that were wrong, starting from its prior difficulty
+    def difficulty(self, question_id):
+        prior = self.questions[question_id].difficulty
+        return (self._misses[question_id] + prior * DIFFICULTY_PRIOR_WEIGHT) / (self._attempts[question_id] + DIFFICULTY_PRIOR_WEIGHT)
+
+    def questions_in_level(self, level):
+        return self.per_level[level]
+
+    def header_html(self, level, index):
+        return self._headers[(level, index)]
+
+    def hearts_html(self, lives):
+        return self._hearts[max(0, min(MAX_LIVES, lives))]
+
+    # Function to decide whether the player is done with a level
+    def level_finished(self, level, answered, streak, adaptive=QUIZ_ADAPTIVE):
+        if answered >= self.per_level[level]:
+            return True
+        return adaptive and level != LEVELS[-1] and streak >= ADAPTIVE_PROMOTE_STREAK
+
+    # Function to get the level after this one (None once the last level is done)
+    def next_level(self, level):
+        position = LEVELS.index(level)
+        return LEVELS[position + 1] if position + 1 < len(LEVELS) else None
+
+    def tagged(self, tag):
+        return tuple(self.questions[i] for i in self.by_tag.get(tag, ()))
+
+
+_bank = None
+_bank_source = None
+_bank_lock = threading.Lock()
+
+
+# Function to get the compiled bank, recompiling only when questions.json was reloaded
+def get_question_bank():
+    global _bank, _bank_source
+    raw = get_json("questions.json")
+    if raw is not _bank_source:
+        with _bank_lock:
+            if raw is not _bank_source:
+                _bank = QuestionBank(raw)
+                _bank_source = raw
+    return _bank
@@ -0,0 +1,198 @@
+import functools
+import os
+from collections import Counter
+from datetime import datetime
+from io import BytesIO
+
+from fpdf import FPDF
+
+from preprocessing import encode_report_image, load_report_input_image
+
+# PDF reports for single predictions and whole lots.
+# Used by the Predict page (on report workers) and by the bulk_classify CLI,
+# so nothing here imports Streamlit. Photos are embedded as JPEG bytes.
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+signature_path = os.path.join(base_dir, 'signature-bean.png')
+
+# Most sample pages one batch certificate embeds; later samples only count towards the summary
+CERTIFICATE_MAX_SAMPLE_PAGES = int(os.getenv("CERTIFICATE_MAX_SAMPLE_PAGES", "200"))
+
+# Report layout: header/footer bars and disclaimer are the same on every page
+class PredictionReportPDF(FPDF):
+    def header(self):
+        # Brown bar at the top
+        self.set_fill_color(139, 69, 19)  # Dark brown color
+        self.rect(0, 0, 210, 15, 'F')
+
+    def footer(self):
+        # Brown bar at the bottom
+        self.set_fill_color(139, 69, 19)  # Dark brown color
+        self.rect(0, 282, 210, 15, 'F')
+        self.set_y(-40)  # Move to the bottom of the page
+        self.set_font("Arial", 'I', size=8)
+        self.multi_cell(0, 10, "Disclaimer: This prediction is based on machine learning models and may not be 100% accurate.", align='C')
+
+# Function to read the signature image once per process
+@functools.lru_cache(maxsize=1)
+def get_signature_image_bytes():
+    with open(signature_path, "rb") as f:
+        return f.read()
+
+# Function to draw one prediction certificate page onto a report
+def add_prediction_page(pdf, test_input_image, test_output_image, predicted_class, confidence, sample_label=None):
+    pdf.add_page()
+
+    # Title
+    pdf.set_font("Arial", 'B', size=24)
+    pdf.set_text_color(139, 69, 19)  # Dark brown color
+    pdf.cell(200, 30, txt="BEANXPERT", ln=True, align='C')
+
+    # Test time
+    pdf.set_font("Arial", size=12)
+    pdf.set_text_color(0, 0, 0)  # Black color
+    test_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    pdf.cell(200, 10, txt=f"TEST TIME: {test_time}", ln=True, align='C')
+    if sample_label:
+        pdf.cell(200, 10, txt=f"SAMPLE: {sample_label}", ln=True, align='C')
+
+    # Test input and output photos (JPEG bytes, embedded without touching disk)
+    pdf.set_font("Arial", 'B', size=14)
+    image_width = 45  # 90 * 0.8 = 72
+    pdf.cell(95, 10, txt="TEST INPUT PHOTO:", ln=0, align='L')
+    pdf.cell(95, 10, txt="TEST OUTPUT PHOTO:", ln=1, align='R')
+    pdf.image(BytesIO(test_input_image), x=10, y=70, w=image_width)
+    pdf.image(BytesIO(test_output_image), x=150, y=70, w=image_width)
+
+    # Test result
+    pdf.ln(100)  # Move cursor down to avoid overlapping
+    pdf.set_font("Arial", size=12)
+    if predicted_class:
+        result_text = f"TEST RESULT: This is a {predicted_class} coffee bean with confidence {confidence:.2f}"
+    else:
+        result_text = f"TEST RESULT: No coffee bean recognised (best confidence {confidence:.2f})"
+    pdf.multi_cell(0, 10, result_text, align='C')
+
+    add_signature(pdf)
+
+# Function to sign the current report page
+def add_signature(pdf):
+    pdf.ln(10)
+    pdf.cell(140)  # Move to the right
+    pdf.set_font("Arial", size=10)
+    pdf.cell(0, 10, "Signed by BeanXpert", ln=True, align='R')
+
+    pdf.image(BytesIO(get_signature_image_bytes()), x=150, y=pdf.get_y(), w=50)  # Adjust width as needed
+
+    pdf.ln(30)
+    pdf.cell(0, 10, "Jaya Iskandar", ln=True, align='R')
+    pdf.cell(0, 10, "Founder of BeanXpert", ln=True, align='R')
+
+def create_pdf(test_input_image, test_output_image, predicted_class, confidence):
+    pdf = PredictionReportPDF()
+    add_prediction_page(pdf, test_input_image, test_output_image, predicted_class, confidence)
+
+    # Return the PDF as bytes for st.download_button
+    return bytes(pdf.output())
+
+# Function to turn a path, file, PIL image, RGB array or JPEG bytes into report-sized JPEG bytes
+def as_report_image(image):
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    if isinstance(image, (str, os.PathLike)) or hasattr(image, "read"):
+        image = load_report_input_image(image)
+    return encode_report_image(image)
+
+# Multi-page certificate for a whole lot: one page per sample plus a summary
+# page with class totals. fpdf2 keeps the whole document (and every embedded
+# JPEG) in memory until it is written out, so only the first max_sample_pages
+# samples get a page; every sample, including the rest, is counted in the
+# summary. Memory therefore stays bounded however large the lot is.
+class BatchCertificate:
+    def __init__(self, lot_name=None, max_sample_pages=CERTIFICATE_MAX_SAMPLE_PAGES):
+        self.lot_name = lot_name
+        self.max_sample_pages = max(0, max_sample_pages)
+        self.pdf = PredictionReportPDF()
+        self.class_totals = Counter()
+        self.confidence_sums = Counter()
+        self.samples = 0
+        self.sample_pages = 0
+
+    def add_sample(self, test_input_image, test_output_image, predicted_class, confidence, sample_label=None):
+        self.samples += 1
+        if self.sample_pages < self.max_sample_pages:
+            self.sample_pages += 1
+            add_prediction_page(
+                self.pdf,
+                as_report_image(test_input_image),
+                as_report_image(test_output_image),
+                predicted_class,
+                confidence,
+                sample_label or f"#{self.samples}",
+            )
+        class_name = predicted_class or "Not a coffee bean"
+        self.class_totals[class_name] += 1
+        self.confidence_sums[class_name] += confidence
+
+    def add_summary_page(self):
+        pdf = self.pdf
+        pdf.add_page()
+
+        pdf.set_font("Arial", 'B', size=24)
+        pdf.set_text_color(139, 69, 19)  # Dark brown color
+        pdf.cell(200, 30, txt="BEANXPERT", ln=True, align='C')
+
+        pdf.set_font("Arial", 'B', size=14)
+        pdf.set_text_color(0, 0, 0)  # Black color
+        pdf.cell(200, 10, txt="BATCH CERTIFICATE SUMMARY", ln=True, align='C')
+        pdf.set_font("Arial", size=12)
+        if self.lot_name:
+            pdf.cell(200, 10, txt=f"LOT: {self.lot_name}", ln=True, align='C')
+        pdf.cell(200, 10, txt=f"ISSUED: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True, align='C')
+        pdf.cell(200, 10, txt=f"SAMPLES CERTIFIED: {self.samples}", ln=True, align='C')
+        if self.sample_pages < self.samples:
+            pdf.cell(200, 10, txt=f"SAMPLE PAGES: FIRST {self.sample_pages} OF {self.samples} (ALL SAMPLES ARE IN THE TOTALS BELOW)", ln=True, align='C')
+        pdf.ln(10)
+
+        # Class totals table
+        pdf.set_font("Arial", 'B', size=12)
+        pdf.cell(80, 10, txt="CLASS", border=1, align='C')
+        pdf.cell(50, 10, txt="SAMPLES", border=1, align='C')
+        pdf.cell(60, 10, txt="MEAN CONFIDENCE", border=1, ln=1, align='C')
+        pdf.set_font("Arial", size=12)
+        for class_name, count in self.class_totals.most_common():
+            pdf.cell(80, 10, txt=str(class_name), border=1, align='C')
+            pdf.cell(50, 10, txt=f"{count} ({count / self.samples:.0%})", border=1, align='C')
+            pdf.cell(60, 10, txt=f"{self.confidence_sums[class_name] / count:.2f}", border=1, ln=1, align='C')
+
+        add_signature(pdf)
+
+    # Write the certificate to a path or file-like object, or return it as bytes
+    def finish(self, output=None):
+        self.add_summary_page()
+        data = bytes(self.pdf.output())
+        if output is None:
+            return data
+        if isinstance(output, (str, os.PathLike)):
+            with open(output, "wb") as f:
+                f.write(data)
+        else:
+            output.write(data)
+        return output
+
+# Function to build one certificate for an iterable of
+# (input image, output image, predicted class, confidence[, sample label]) samples
+def create_batch_pdf(samples, output=None, lot_name=None, max_sample_pages=CERTIFICATE_MAX_SAMPLE_PAGES):
+    certificate = BatchCertificate(lot_name, max_sample_pages)
+    for sample in samples:
+        certificate.add_sample(*sample)
+    return certificate.finish(output)
+
+# Function run on a report worker: encode both photos and render the PDF
+def build_prediction_report(input_image_bytes, output_image, predicted_class, confidence):
+    return create_pdf(
+        encode_report_image(load_report_input_image(BytesIO(input_image_bytes))),
+        encode_report_image(output_image),
+        predicted_class,
+        confidence,
+    )
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Background report rendering.
+# PDF rendering and image encoding run on a small, bounded pool of worker
+# threads instead of the Streamlit script thread. Pages submit a job keyed by
+# the prediction hash and poll its status; finished reports stay in memory for
+# REPORT_TTL_SECONDS so reruns and repeat downloads are served without
+# rendering again. The finished reports kept are also capped at
+# REPORT_MAX_CACHED jobs and REPORT_MAX_CACHED_BYTES of results; past either
+# cap the least recently used ones are dropped first. At most
+# REPORT_MAX_PENDING jobs may be queued or running, so a burst of requests
+# cannot oversubscribe the CPU.
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_MAX_PENDING = int(os.getenv("REPORT_MAX_PENDING", "32"))
+REPORT_TTL_SECONDS = float(os.getenv("REPORT_TTL_SECONDS", "900"))
+REPORT_MAX_CACHED = int(os.getenv("REPORT_MAX_CACHED", "64"))
+REPORT_MAX_CACHED_BYTES = int(os.getenv("REPORT_MAX_CACHED_BYTES", str(64 * 2**20)))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class ReportQueueFull(Exception):
+    pass
+
+
+class ReportJob:
+    __slots__ = ("key", "status", "result", "error", "submitted_at", "finished_at")
+
+    def __init__(self, key):
+        self.key = key
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def pending(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def size(self):
+        return len(self.result) if isinstance(self.result, (bytes, bytearray)) else 0
+
+
+class ReportService:
+    def __init__(self, workers=REPORT_WORKERS, max_pending=REPORT_MAX_PENDING, ttl_seconds=REPORT_TTL_SECONDS,
+                 max_cached=REPORT_MAX_CACHED, max_cached_bytes=REPORT_MAX_CACHED_BYTES):
+        self.max_pending = max(1, max_pending)
+        self.ttl_seconds = ttl_seconds
+        self.max_cached = max(1, max_cached)
+        self.max_cached_bytes = max_cached_bytes
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="report-worker")
+        self._jobs = OrderedDict()  # Least recently used first
+        self._pending = 0
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    # Queue fn(*args) under key, reusing a pending or finished job for the same key
+    def submit(self, key, fn, *args):
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(key)
+            if job is not None and job.status != FAILED:
+                self._jobs.move_to_end(key)
+                return job
+            if self._pending >= self.max_pending:
+                raise ReportQueueFull("Too many reports are being prepared right now. Please try again shortly.")
+
+            self._forget(key)  # A failed job being retried
+            job = self._jobs[key] = ReportJob(key)
+            self._pending += 1
+
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, key):
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _run(self, job, fn, args):
+        job.status = RUNNING
+        try:
+            job.result = fn(*args)
+            job.status = DONE
+        except Exception as e:
+            print(f"Error generating report {job.key}: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            with self._lock:
+                job.finished_at = time.monotonic()
+                self._pending -= 1
+                if self._jobs.get(job.key) is job:
+                    self._cached_bytes += job.size
+                    self._evict_over_limit(keep=job.key)
+
+    def _forget(self, key):
+        job = self._jobs.pop(key, None)
+        if job is not None and job.finished_at is not None:
+            self._cached_bytes -= job.size
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        expired = [key for key, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.ttl_seconds]
+        for key in expired:
+            self._forget(key)
+
+    # Drop least recently used finished reports until both caps are met.
+    # Pending jobs and the report that just finished are always kept.
+    def _evict_over_limit(self, keep=None):
+        finished = [key for key, job in self._jobs.items() if job.finished_at is not None and key != keep]
+        count = len(finished) + (keep is not None)
+        for key in finished:
+            if count <= self.max_cached and self._cached_bytes <= self.max_cached_bytes:
+                break
+            self._forget(key)
+            count -= 1
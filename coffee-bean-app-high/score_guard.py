@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from question_bank import MAX_LIVES
+
+# Server-side checks before a quiz result reaches the leaderboard.
+# The game session keeps a monotonic-clock event log (game start, each
+# question shown, each answer); validate_game() replays it and rejects results
+# that could not come from playing the game in this process: answers faster
+# than a person can read, repeated questions, or a score and lives that do not
+# match the answers. The time that is stored comes from the log, not from the
+# browser. Submissions are also rate limited per nickname and per client IP
+# with token buckets, so reruns or scripts cannot flood the collection.
+
+MIN_ANSWER_SECONDS = float(os.getenv("QUIZ_MIN_ANSWER_SECONDS", "1.0"))
+
+SCORE_RATE_PER_MINUTE_NICKNAME = float(os.getenv("SCORE_RATE_PER_MINUTE_NICKNAME", "2"))
+SCORE_BURST_NICKNAME = int(os.getenv("SCORE_BURST_NICKNAME", "3"))
+SCORE_RATE_PER_MINUTE_IP = float(os.getenv("SCORE_RATE_PER_MINUTE_IP", "6"))
+SCORE_BURST_IP = int(os.getenv("SCORE_BURST_IP", "10"))
+
+
+class InvalidScore(Exception):
+    pass
+
+
+class ScoreRateLimited(Exception):
+    pass
+
+
+# Function to check a finished game's event log; returns the validated play time in seconds
+def validate_game(session, questions, min_answer_seconds=MIN_ANSWER_SECONDS):
+    events = session.events
+    if not events or events[0][0] != "start":
+        raise InvalidScore("game has no start event")
+    if any(later[1] < earlier[1] for earlier, later in zip(events, events[1:])):
+        raise InvalidScore("event times are not monotonic")
+
+    answers = []
+    shown = None
+    for event in events[1:]:
+        if event[0] == "shown":
+            shown = event
+        elif event[0] == "answer":
+            if shown is None or shown[2] != event[2]:
+                raise InvalidScore(f"question {event[2]} was answered without being shown")
+            if event[1] - shown[1] < min_answer_seconds:
+                raise InvalidScore(f"question {event[2]} was answered in {event[1] - shown[1]:.2f}s")
+            answers.append(event)
+            shown = None
+
+    question_ids = [answer[2] for answer in answers]
+    if len(set(question_ids)) != len(question_ids):
+        raise InvalidScore("a question was answered twice")
+    if len(answers) > sum(questions.questions_in_level(level) for level in questions.per_level):
+        raise InvalidScore("more answers than questions in a game")
+
+    correct = sum(1 for answer in answers if answer[3])
+    if correct != session.score:
+        raise InvalidScore(f"score {session.score} does not match {correct} correct answers")
+    if MAX_LIVES - (len(answers) - correct) != session.lives:
+        raise InvalidScore("lives do not match the wrong answers")
+    if session.lives > 0 and session.level is not None:
+        raise InvalidScore("game is not over")
+
+    return events[-1][1] - events[0][1]
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate_per_minute, burst, max_keys=10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    # Take one token for key; False when its bucket is empty
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)  # Least recently seen; a fresh bucket is full anyway
+            return allowed
+
+
+nickname_limiter = TokenBucketLimiter(SCORE_RATE_PER_MINUTE_NICKNAME, SCORE_BURST_NICKNAME)
+ip_limiter = TokenBucketLimiter(SCORE_RATE_PER_MINUTE_IP, SCORE_BURST_IP)
+
+
+# Function to apply the per-nickname and per-IP submission limits
+def check_rate_limit(nickname, ip=None):
+    if not nickname_limiter.allow(nickname.strip().lower()):
+        raise ScoreRateLimited("Too many scores submitted for this nickname. Please try again later.")
+    if ip and not ip_limiter.allow(ip):
+        raise ScoreRateLimited("Too many scores submitted from this network. Please try again later.")
@@ -0,0 +1,58 @@
+import tracemalloc
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip("fpdf")
+pytest.importorskip("cv2")
+Image = pytest.importorskip("PIL.Image")
+np = pytest.importorskip("numpy")
+
+from report_pdf import BatchCertificate  # noqa: E402
+
+
+# A noisy photo compresses badly, so each embedded copy is tens of kilobytes
+def make_jpeg(seed, size=160):
+    pixels = np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def test_large_lot_keeps_memory_bounded():
+    certificate = BatchCertificate("lot-test", max_sample_pages=5)
+
+    # A different photo per sample, since fpdf2 embeds identical images only once
+    def add_samples(count):
+        for i in range(count):
+            photo = make_jpeg(certificate.samples, size=64)
+            certificate.add_sample(photo, photo, "Arabica" if i % 3 else None, 0.9, f"bean-{i}.jpg")
+
+    add_samples(10)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        add_samples(300)  # Uncapped, this would embed 600 more photos (several MB)
+        growth = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    finally:
+        tracemalloc.stop()
+
+    assert certificate.samples == 310
+    assert certificate.sample_pages == 5
+    assert certificate.pdf.page == 5
+    assert growth < 256 * 1024
+
+    data = certificate.finish()
+    assert data.startswith(b"%PDF")
+    assert certificate.pdf.page == 6  # Sample pages plus the summary
+    assert sum(certificate.class_totals.values()) == 310
+
+
+def test_small_lot_gets_a_page_per_sample():
+    photo = make_jpeg(0)
+    certificate = BatchCertificate(max_sample_pages=5)
+    for i in range(3):
+        certificate.add_sample(photo, photo, "Robusta", 0.8)
+    certificate.finish()
+    assert certificate.sample_pages == 3
+    assert certificate.pdf.page == 4
@@ -0,0 +1,132 @@
+import itertools
+from collections import Counter
+
+# Lightweight multi-object tracker for the live camera.
+# Detections are associated with existing tracks by IoU (falling back to
+# centroid distance for small, fast-moving boxes). Between detections each
+# track is moved by a constant-velocity motion model and its confidence decays,
+# so the camera can run YOLO only every few frames and still draw stable boxes.
+# Labels are a majority vote over the track's history, which stops them
+# flickering between classes from one detection to the next.
+
+
+# Function to compute intersection-over-union of two (x1, y1, x2, y2) boxes
+def box_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter == 0.0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / (area_a + area_b - inter)
+
+
+# Function to check whether two box centres are closer than the boxes are wide
+def centroids_close(a, b):
+    ax, ay = (a[0] + a[2]) / 2, (a[1] + a[3]) / 2
+    bx, by = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+    reach = max(a[2] - a[0], a[3] - a[1], b[2] - b[0], b[3] - b[1]) / 2
+    return (ax - bx) ** 2 + (ay - by) ** 2 <= reach ** 2
+
+
+class Track:
+    __slots__ = ("track_id", "box", "velocity", "confidence", "class_votes", "frames_since_detection", "misses")
+
+    def __init__(self, track_id, box, class_name, confidence):
+        self.track_id = track_id
+        self.box = list(box)
+        self.velocity = [0.0, 0.0, 0.0, 0.0]  # Per-frame change of x1, y1, x2, y2
+        self.confidence = confidence
+        self.class_votes = Counter({class_name: confidence})
+        self.frames_since_detection = 0
+        self.misses = 0
+
+    @property
+    def class_name(self):
+        return self.class_votes.most_common(1)[0][0]
+
+    def int_box(self):
+        return tuple(int(round(v)) for v in self.box)
+
+
+class IoUTracker:
+    def __init__(self, iou_threshold=0.3, confidence_decay=0.92, min_confidence=0.3, max_misses=3, velocity_smoothing=0.5):
+        self.iou_threshold = iou_threshold
+        self.confidence_decay = confidence_decay
+        self.min_confidence = min_confidence
+        self.max_misses = max_misses
+        self.velocity_smoothing = velocity_smoothing
+
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    # Advance every track by one frame using its motion model
+    def predict(self):
+        alive = []
+        for track in self.tracks:
+            track.box = [v + dv for v, dv in zip(track.box, track.velocity)]
+            track.frames_since_detection += 1
+            track.confidence *= self.confidence_decay
+            if track.confidence >= self.min_confidence:
+                alive.append(track)
+        self.tracks = alive
+        return self.tracks
+
+    # Merge a new set of (box, class_name, confidence) detections into the tracks
+    def update(self, detections):
+        pairs = []
+        for t_idx, track in enumerate(self.tracks):
+            for d_idx, (box, _, _) in enumerate(detections):
+                iou = box_iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, t_idx, d_idx))
+                elif centroids_close(track.box, box):
+                    pairs.append((0.0, t_idx, d_idx))
+
+        # Greedy association, best overlap first
+        pairs.sort(reverse=True)
+        matched_tracks, matched_detections = set(), set()
+        for _, t_idx, d_idx in pairs:
+            if t_idx in matched_tracks or d_idx in matched_detections:
+                continue
+            matched_tracks.add(t_idx)
+            matched_detections.add(d_idx)
+            self._correct(self.tracks[t_idx], *detections[d_idx])
+
+        survivors = []
+        for t_idx, track in enumerate(self.tracks):
+            if t_idx not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+
+        for d_idx, (box, class_name, confidence) in enumerate(detections):
+            if d_idx not in matched_detections:
+                survivors.append(Track(next(self._ids), box, class_name, confidence))
+
+        self.tracks = survivors
+        return self.tracks
+
+    # Lowest confidence among live tracks (0 when nothing is tracked)
+    def weakest_confidence(self):
+        return min((track.confidence for track in self.tracks), default=0.0)
+
+    def reset(self):
+        self.tracks = []
+
+    def _correct(self, track, box, class_name, confidence):
+        # The track box has been extrapolated since the last detection, so the
+        # observed per-frame velocity is measured against the pre-motion position
+        frames = max(track.frames_since_detection, 1)
+        previous = [v - dv * track.frames_since_detection for v, dv in zip(track.box, track.velocity)]
+        observed = [(new - old) / frames for new, old in zip(box, previous)]
+        alpha = self.velocity_smoothing
+        track.velocity = [alpha * o + (1 - alpha) * v for o, v in zip(observed, track.velocity)]
+
+        track.box = list(box)
+        track.confidence = confidence
+        track.class_votes[class_name] += confidence
+        track.frames_since_detection = 0
+        track.misses = 0
@@ -0,0 +1,90 @@
+import numpy as np
+
+# Whole-tray analysis of a single YOLO result.
+# Every box above the confidence threshold is kept, overlapping boxes of the
+# same class are merged with class-aware NMS, and counts, a confidence
+# histogram and box-size statistics are computed with NumPy directly over the
+# boxes tensor (x1, y1, x2, y2, confidence, class_id per row).
+
+
+# Function to get the (n, 6) detection array of a Results object as NumPy
+def boxes_to_array(result):
+    data = result.boxes.data
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    return np.asarray(data, dtype=np.float32).reshape(-1, 6)
+
+
+# Function to run greedy non-maximum suppression separately for each class
+def class_aware_nms(boxes, scores, classes, iou_threshold=0.5):
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Shift each class into its own coordinate range so boxes of different
+    # classes never overlap, then run a single NMS pass over everything
+    offsets = classes.astype(np.float32)[:, None] * (boxes.max() + 1.0)
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+# Function to summarise min/mean/max/std of a 1-D array
+def describe(values):
+    if values.size == 0:
+        return {"min": 0.0, "mean": 0.0, "max": 0.0, "std": 0.0}
+    return {
+        "min": float(values.min()),
+        "mean": float(values.mean()),
+        "max": float(values.max()),
+        "std": float(values.std()),
+    }
+
+
+# Function to analyse every bean detected in a tray photo
+def analyze_tray(result, names, confidence_threshold=0.5, iou_threshold=0.5, histogram_bins=10):
+    data = boxes_to_array(result)
+    data = data[data[:, 4] >= confidence_threshold]
+
+    keep = class_aware_nms(data[:, :4], data[:, 4], data[:, 5].astype(np.int64), iou_threshold)
+    detections = data[keep]
+
+    boxes = detections[:, :4]
+    confidences = detections[:, 4]
+    class_ids = detections[:, 5].astype(np.int64)
+
+    counts = np.bincount(class_ids, minlength=len(names))
+    class_counts = {names[i]: int(counts[i]) for i in range(len(names))}
+
+    histogram, bin_edges = np.histogram(confidences, bins=histogram_bins, range=(confidence_threshold, 1.0))
+
+    widths = boxes[:, 2] - boxes[:, 0]
+    heights = boxes[:, 3] - boxes[:, 1]
+    areas = widths * heights
+    aspect_ratios = np.divide(widths, heights, out=np.zeros_like(widths), where=heights > 0)
+
+    return {
+        "detections": detections,
+        "total": int(detections.shape[0]),
+        "class_counts": class_counts,
+        "confidence_histogram": {"counts": histogram.tolist(), "bin_edges": bin_edges.tolist()},
+        "box_stats": {
+            "width": describe(widths),
+            "height": describe(heights),
+            "area": describe(areas),
+            "aspect_ratio": describe(aspect_ratios),
+            "confidence": describe(confidences),
+        },
+    }
@@ -0,0 +1,243 @@
+import atexit
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from firebase_admin import firestore
+
+# Write-behind queue for Firestore document writes.
+# Callers enqueue a set() and return immediately; a background thread coalesces
+# queued writes into WriteBatch commits of up to 500 operations. Document ids
+# are assigned when the write is queued, so retrying a batch (or replaying it
+# after a restart) is idempotent. Every queued write is appended to a local
+# spool file first, which is replayed on startup and compacted after each
+# successful commit. Batches that keep failing are moved to a .failed file so
+# one bad write cannot block the queue.
+
+base_dir = os.path.abspath(os.path.dirname(__file__))
+
+MAX_BATCH_OPS = 500  # Firestore limit per WriteBatch
+WRITE_QUEUE_MAX_ITEMS = int(os.getenv("WRITE_QUEUE_MAX_ITEMS", "10000"))
+WRITE_QUEUE_FLUSH_SECONDS = float(os.getenv("WRITE_QUEUE_FLUSH_SECONDS", "1.0"))
+WRITE_QUEUE_MAX_ATTEMPTS = int(os.getenv("WRITE_QUEUE_MAX_ATTEMPTS", "8"))
+WRITE_QUEUE_SPOOL_PATH = os.getenv("WRITE_QUEUE_SPOOL_PATH", os.path.join(base_dir, ".firestore_spool.jsonl"))
+
+_SERVER_TIMESTAMP_MARKER = {"__sentinel__": "SERVER_TIMESTAMP"}
+
+
+# Functions to store write payloads as JSON (SERVER_TIMESTAMP is a sentinel object)
+def encode_payload(data):
+    return {key: _SERVER_TIMESTAMP_MARKER if value is firestore.SERVER_TIMESTAMP else value for key, value in data.items()}
+
+
+def decode_payload(data):
+    return {key: firestore.SERVER_TIMESTAMP if value == _SERVER_TIMESTAMP_MARKER else value for key, value in data.items()}
+
+
+class FirestoreWriteQueue:
+    def __init__(self, db, spool_path=WRITE_QUEUE_SPOOL_PATH, max_items=WRITE_QUEUE_MAX_ITEMS,
+                 flush_seconds=WRITE_QUEUE_FLUSH_SECONDS, max_attempts=WRITE_QUEUE_MAX_ATTEMPTS):
+        self.db = db
+        self.spool_path = spool_path
+        self.max_items = max(1, max_items)
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max(1, max_attempts)
+
+        self._pending = deque()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._flush_requested = False
+        self._commit_listeners = []
+
+        self.committed = 0
+        self.failed = 0
+
+        self._replay_spool()
+        self._worker = threading.Thread(target=self._run, name="firestore-write-queue", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    # Queue a document set() and return the document id it will be written to
+    def enqueue_set(self, collection, data, document_id=None, merge=False):
+        if document_id is None:
+            document_id = self.db.collection(collection).document().id  # Generated locally, no round trip
+        op = {"collection": collection, "document": document_id, "data": encode_payload(data), "merge": merge}
+
+        with self._cond:
+            queue_full = len(self._pending) + self._in_flight >= self.max_items
+            if not queue_full:
+                self._append_to_spool(op)
+                self._pending.append(op)
+                self._cond.notify()
+
+        if queue_full:
+            # Apply back-pressure by writing this one inline; if Firestore is
+            # down too, keep the write in the .failed file instead of raising
+            try:
+                self._commit([op])
+            except Exception as e:
+                print(f"Error committing Firestore write inline with the queue full: {e}")
+                with self._cond:
+                    self.failed += 1
+                self._write_dead_letters([op])
+            else:
+                self._notify_listeners([op])
+        return document_id
+
+    # Register fn(ops) to be called after each successful commit
+    def add_commit_listener(self, fn):
+        self._commit_listeners.append(fn)
+
+    # Wait until everything queued so far has been committed (or given up on)
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        with self._cond:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending and self._stopping:
+                    return
+                # Give other writes a moment to arrive so they share the commit
+                deadline = time.monotonic() + self.flush_seconds
+                while not self._stopping and not self._flush_requested and len(self._pending) < MAX_BATCH_OPS:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush_requested = False
+                batch = [self._pending.popleft() for _ in range(min(MAX_BATCH_OPS, len(self._pending)))]
+                self._in_flight = len(batch)
+
+            committed = self._commit_with_retries(batch)
+
+            with self._cond:
+                self._in_flight = 0
+                shutting_down = self._stopping and not committed
+                if shutting_down:
+                    # Leave them in the spool to be replayed on the next start
+                    self._pending.extendleft(reversed(batch))
+                elif committed:
+                    self.committed += len(batch)
+                else:
+                    self.failed += len(batch)
+                self._rewrite_spool()
+                self._cond.notify_all()
+
+            if shutting_down:
+                return
+            if committed:
+                self._notify_listeners(batch)
+            else:
+                self._write_dead_letters(batch)
+
+    def _commit(self, ops):
+        batch = self.db.batch()
+        for op in ops:
+            doc_ref = self.db.collection(op["collection"]).document(op["document"])
+            batch.set(doc_ref, decode_payload(op["data"]), merge=op["merge"])
+        batch.commit()
+
+    def _commit_with_retries(self, ops):
+        for attempt in range(self.max_attempts):
+            try:
+                self._commit(ops)
+                return True
+            except Exception as e:
+                print(f"Error committing {len(ops)} queued Firestore writes (attempt {attempt + 1}): {e}")
+                if attempt + 1 < self.max_attempts and not self._stopping:
+                    # Exponential backoff with jitter, capped at 30 seconds
+                    time.sleep(min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2))
+        return False
+
+    def _notify_listeners(self, ops):
+        for listener in self._commit_listeners:
+            try:
+                listener(ops)
+            except Exception as e:
+                print(f"Error in write queue commit listener: {e}")
+
+    def _replay_spool(self):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self._pending.append(json.loads(line))
+                except ValueError:
+                    continue  # Torn last line from a crash mid-append
+        if self._pending:
+            print(f"Replaying {len(self._pending)} spooled Firestore writes.")
+
+    def _append_to_spool(self, op):
+        if not self.spool_path:
+            return
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(op) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"Error writing Firestore spool: {e}")
+
+    def _rewrite_spool(self):
+        # Keep only writes that are still queued (called with the lock held)
+        if not self.spool_path:
+            return
+        tmp_path = f"{self.spool_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for op in self._pending:
+                    f.write(json.dumps(op) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.spool_path)
+        except OSError as e:
+            print(f"Error compacting Firestore spool: {e}")
+
+    def _write_dead_letters(self, ops):
+        if not self.spool_path:
+            return
+        try:
+            with open(f"{self.spool_path}.failed", "a", encoding="utf-8") as f:
+                for op in ops:
+                    f.write(json.dumps(op) + "\n")
+        except OSError as e:
+            print(f"Error writing failed Firestore writes: {e}")
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+# Function to get the process-wide write queue
+def get_write_queue():
+    global _write_queue
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                from firebase_config import get_db
+                _write_queue = FirestoreWriteQueue(get_db())
+    return _write_queue